@@ -0,0 +1,294 @@
+import os  # used to replace checkpoint files atomically
+import json  # used to save & load the header of checkpoints
+import time  # used to wait before retrying failed artists
+
+from array import array  # used to store the depth of each artist compactly
+from concurrent.futures import ThreadPoolExecutor  # used to request several artists at once
+
+from compact_ids import IdTable  # used to store visited artists compactly
+
+
+class RelatedArtistCrawler:
+
+    """
+    Crawls the related-artist graph of Spotify using a breadth-first search.
+    Related artists are requested concurrently, and the graph is written as an edge list
+    (one "<artist_id>\t<related_artist_id>" line per edge).
+    The visited artists are saved to checkpoint files, so an interrupted crawl can be resumed.
+    Each checkpoint only appends the artists visited since the previous one (as binary ids & depths),
+    so checkpoints don't get slower as the crawl grows.
+    Artists whose related artists couldn't be retrieved (i.e the request was rate limited) are retried
+    once the queue is empty, so the graph doesn't silently miss their edges.
+    Visited artists are kept in an IdTable (see compact_ids), in the order they were visited, which is also
+    the order in which they are expanded: the queue is the visited artists that haven't been expanded yet.
+    """
+
+    def __init__(self, search_client, edges_path, checkpoint_path=None, max_depth=2, max_nodes=10000,
+                 max_workers=8, checkpoint_every=200, retries=3, retry_delay=10):
+
+        """
+        search_client: the SptfySearchClient used to request the related artists.
+        edges_path: the file to which the edge list is written.
+        checkpoint_path: the file in which the state of the crawl is saved (a small JSON header). The visited artists
+        & their depths are appended to "<checkpoint_path>.ids" & "<checkpoint_path>.depths".
+        If None, the crawl can't be resumed.
+        max_depth: the maximum distance (number of edges) from a seed artist. Seeds have depth 0.
+        Depths are stored as signed bytes (in memory & in checkpoints), so it can't be over 127.
+        max_nodes: the maximum number of artists that are visited (seeds included).
+        max_workers: the maximum number of requests sent at once.
+        checkpoint_every: the number of artists expanded between checkpoints.
+        retries: the number of times artists whose request failed are retried, once the queue is empty.
+        retry_delay: the number of seconds waited before the first retry. It doubles with each retry.
+        visited: artists that have been added to the graph, in the order they were added.
+        depths: the depth of each visited artist (by its number in visited).
+        expanded: the number of visited artists that have been expanded (or skipped, at the maximum depth).
+        failed: artists whose related artists couldn't be retrieved (yet). They are retried, and saved in checkpoints.
+        saved: the number of visited artists already written to the checkpoint files.
+        """
+
+        if not 0 <= max_depth <= 127:
+            raise ValueError(f"max_depth must be between 0 and 127 (not {max_depth})")
+
+        self.search_client = search_client
+        self.edges_path = edges_path
+        self.checkpoint_path = checkpoint_path
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_workers = max_workers
+        self.checkpoint_every = checkpoint_every
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+        self.visited = IdTable()
+        self.depths = array("b")
+        self.expanded = 0
+        self.failed = []
+        self.edges_written = 0
+        self.saved = 0
+
+    def get_related_artist_ids(self, artist_id):
+
+        """
+        Returns the ids of the related artists of an artist.
+        If the request fails, None is returned.
+        :param artist_id: the id of the artist.
+        """
+
+        related = self.search_client.get_resource(artist_id, resource_type="artist", keyword="related-artists")
+
+        if "artists" not in related:
+            return None
+
+        return [artist["id"] for artist in related["artists"]]
+
+    def visit(self, artist_id, depth):
+
+        """
+        Adds an artist to the graph (and so, to the queue)
+        :param artist_id: the id of the artist.
+        :param depth: the distance from the closest seed artist.
+        """
+
+        self.visited.add(artist_id)
+        self.depths.append(depth)
+
+    def get_batch(self):
+
+        """
+        Takes the next artists to expand from the queue (up to checkpoint_every), and returns their ids & depths
+        Artists at the maximum depth are skipped: their related artists would be too far from the seeds.
+        Seeds are always expanded.
+        """
+
+        batch = []
+
+        while self.expanded < len(self.visited) and len(batch) < self.checkpoint_every:
+            depth = self.depths[self.expanded]
+
+            if depth == 0 or depth < self.max_depth:
+                batch.append((self.visited.get_id(self.expanded), depth))
+            self.expanded += 1
+
+        return batch
+
+    def expand(self, batch, executor, edges_file):
+
+        """
+        Requests the related artists of a batch of artists at once, visits the new ones, writes the edges,
+        and saves a checkpoint. Artists whose request fails are added to failed.
+        :param batch: a list of (artist_id, depth) tuples (see get_batch)
+        :param executor: the ThreadPoolExecutor sending the requests
+        :param edges_file: the open edge list
+        """
+
+        related_ids = executor.map(self.get_related_artist_ids, [artist_id for artist_id, _ in batch])
+
+        # results are processed in queue order, so the search remains breadth-first
+        for (artist_id, depth), related in zip(batch, related_ids):
+            if related is None:
+                self.failed.append(artist_id)
+                continue
+
+            for related_id in related:
+                if related_id not in self.visited:
+                    if depth + 1 > self.max_depth or len(self.visited) >= self.max_nodes:
+                        continue
+                    self.visit(related_id, depth + 1)
+
+                edges_file.write(f"{artist_id}\t{related_id}\n")
+                self.edges_written += 1
+
+        edges_file.flush()
+        self.save_checkpoint(edges_file.tell())
+
+        print(f"Crawled {len(self.visited)} artists ({len(self.visited) - self.expanded} in the queue), "
+              f"{self.edges_written} edges")
+
+    def get_checkpoint_paths(self):
+        return f"{self.checkpoint_path}.ids", f"{self.checkpoint_path}.depths"
+
+    def save_checkpoint(self, edges_offset):
+
+        """
+        Saves the state of the crawl to the checkpoint files.
+        The artists visited since the previous checkpoint are appended to the ids & depths files, then the header
+        (the number of artists saved, the progress of the queue, the failed artists & the length of the edge list)
+        is replaced atomically. Only the artists counted in the header are loaded, so a crash while saving doesn't
+        corrupt the previous checkpoint.
+        :param edges_offset: the size (in bytes) of the edge list when the checkpoint is taken.
+        """
+
+        if self.checkpoint_path is None:
+            return
+
+        ids_path, depths_path = self.get_checkpoint_paths()
+        mode = "ab" if self.saved else "wb"  # a new crawl replaces the files of any previous one
+
+        with open(ids_path, mode) as f:
+            self.visited.get_values(self.saved).tofile(f)
+
+        with open(depths_path, mode) as f:
+            self.depths[self.saved:].tofile(f)
+
+        checkpoint = {
+            "visited": len(self.visited),
+            "expanded": self.expanded,
+            "failed": self.failed,
+            "edges_offset": edges_offset,
+            "edges_written": self.edges_written
+        }
+
+        temporary_path = f"{self.checkpoint_path}.tmp"
+
+        with open(temporary_path, "w") as f:
+            json.dump(checkpoint, f, separators=(",", ":"))
+
+        os.replace(temporary_path, self.checkpoint_path)
+        self.saved = len(self.visited)
+
+    def load_checkpoint(self):
+
+        """
+        Loads the state of a previous crawl from the checkpoint files.
+        Returns the size (in bytes) of the edge list when the checkpoint was taken, or None if there is no checkpoint.
+        """
+
+        if self.checkpoint_path is None or not os.path.exists(self.checkpoint_path):
+            return None
+
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+
+        count = checkpoint["visited"]
+        ids_path, depths_path = self.get_checkpoint_paths()
+
+        values = array("Q")
+        self.depths = array("b")
+
+        # artists appended after the header was saved (i.e the process crashed while saving) are dropped
+        with open(ids_path, "r+b") as f:
+            values.fromfile(f, 2 * count)
+            f.truncate(values.itemsize * len(values))
+
+        with open(depths_path, "r+b") as f:
+            self.depths.fromfile(f, count)
+            f.truncate(self.depths.itemsize * len(self.depths))
+
+        self.visited = IdTable(capacity=count)
+        self.visited.add_values(values)
+        self.expanded = checkpoint["expanded"]
+        self.failed = checkpoint["failed"]
+        self.edges_written = checkpoint["edges_written"]
+        self.saved = count
+
+        return checkpoint["edges_offset"]
+
+    def crawl(self, seed_ids):
+
+        """
+        Crawls the related-artist graph, starting from the seed artists.
+        If a checkpoint exists, the crawl is resumed from it (and the seeds are ignored).
+        Returns the number of edges in the edge list.
+        :param seed_ids: a list of artist ids from which to start the crawl.
+        """
+
+        edges_offset = self.load_checkpoint()
+
+        if edges_offset is None:
+            for seed_id in seed_ids:
+                if seed_id not in self.visited and len(self.visited) < self.max_nodes:
+                    self.visit(seed_id, 0)
+            edges_offset = 0
+            edges_file = open(self.edges_path, "w")
+        else:
+            print(f"Resuming crawl: {len(self.visited)} artists visited, {len(self.visited) - self.expanded} in the queue")
+            # anything written after the checkpoint is written again
+            edges_file = open(self.edges_path, "a")
+            edges_file.truncate(edges_offset)
+
+        # the related artists of every batch are requested with this token (until it expires)
+        self.search_client.get_access_token()
+
+        with edges_file, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            retry = 0
+
+            while True:
+                while self.expanded < len(self.visited):
+                    self.expand(self.get_batch(), executor, edges_file)
+
+                # artists that failed (before this run, or during it) are retried once the queue is empty
+                if not self.failed or retry == self.retries:
+                    break
+
+                delay = self.retry_delay * 2 ** retry
+                retry += 1
+                print(f"Retrying {len(self.failed)} failed artists in {delay} seconds ({retry} of {self.retries})")
+                time.sleep(delay)
+
+                # artists stay in failed until they are retried, so checkpoints taken in between still hold them.
+                # Artists failing again are added to the end of the list.
+                remaining = len(self.failed)
+                while remaining:
+                    retried = self.failed[:min(remaining, self.checkpoint_every)]
+                    del self.failed[:len(retried)]
+                    remaining -= len(retried)
+                    self.expand([(artist_id, self.depths[self.visited.get_number(artist_id)]) for artist_id in retried],
+                                executor, edges_file)
+
+        if self.failed:
+            print(f"{len(self.failed)} artists couldn't be expanded. Calling crawl again retries them")
+
+        return self.edges_written
+
+
+def read_edges(edges_path):
+
+    """
+    Reads an edge list written by RelatedArtistCrawler, yielding (artist_id, related_artist_id) tuples
+    :param edges_path: the file containing the edge list.
+    """
+
+    with open(edges_path) as f:
+        for line in f:
+            artist_id, related_id = line.rstrip("\n").split("\t")
+            yield artist_id, related_id
@@ -0,0 +1,242 @@
+import time  # used to wait before retrying failed batches
+
+import numpy as np  # used to store & analyse audio features as arrays
+
+from urllib.parse import urlencode  # used to parse URLs for queries in Spotify
+from concurrent.futures import ThreadPoolExecutor  # used to request several batches of audio features at once
+
+from spotify_deadline import propagate  # used to pass the deadline of the caller to the threads
+
+# https://developer.spotify.com/documentation/web-api/reference/tracks/get-several-audio-features/
+# one column per feature, in this order
+feature_columns = ("danceability", "energy", "key", "loudness", "mode", "speechiness", "acousticness",
+                   "instrumentalness", "liveness", "valence", "tempo", "duration_ms", "time_signature")
+
+# features measured between 0 and 1, which can be compared without rescaling
+similarity_columns = ("danceability", "energy", "speechiness", "acousticness", "instrumentalness", "liveness",
+                      "valence")
+
+
+class AudioFeatures:
+
+    """
+    Audio features of a set of tracks, stored as a NumPy array with one row per track and one column per feature.
+    """
+
+    def __init__(self, track_ids, matrix):
+
+        """
+        track_ids: the ids of the tracks, in the same order as the rows of the matrix.
+        matrix: a 2D float array, with one column per feature (in the order of feature_columns).
+        """
+
+        self.track_ids = list(track_ids)
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, len(feature_columns))
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def column(self, feature):
+
+        """
+        Returns the values of a feature for every track
+        :param feature: the name of the feature (i.e "tempo")
+        """
+
+        return self.matrix[:, feature_columns.index(feature)]
+
+    def summary(self):
+
+        """
+        Returns a dictionary containing the mean, standard deviation, minimum, median and maximum of every feature
+        """
+
+        if len(self) == 0:
+            return {}
+
+        statistics = {
+            "mean": self.matrix.mean(axis=0),
+            "std": self.matrix.std(axis=0),
+            "min": self.matrix.min(axis=0),
+            "median": np.median(self.matrix, axis=0),
+            "max": self.matrix.max(axis=0)
+        }
+
+        return {feature: {name: float(values[i]) for name, values in statistics.items()}
+                for i, feature in enumerate(feature_columns)}
+
+    def filter(self, **ranges):
+
+        """
+        Returns the tracks whose features are within the given ranges.
+        For example, filter(tempo=(120, 130), energy=(0.8, None)) returns the tracks with a tempo between 120 and 130,
+        and an energy of at least 0.8. Bounds are inclusive, and None means the range is unbounded.
+        :param ranges: the name of the features, and a (minimum, maximum) tuple
+        """
+
+        mask = np.ones(len(self), dtype=bool)
+
+        for feature, (minimum, maximum) in ranges.items():
+            values = self.column(feature)
+            if minimum is not None:
+                mask &= values >= minimum
+            if maximum is not None:
+                mask &= values <= maximum
+
+        return AudioFeatures(np.asarray(self.track_ids, dtype=object)[mask], self.matrix[mask])
+
+    def centroid(self, columns=similarity_columns):
+
+        """
+        Returns the mean value of the given features
+        :param columns: the names of the features
+        """
+
+        indices = [feature_columns.index(feature) for feature in columns]
+
+        return self.matrix[:, indices].mean(axis=0)
+
+    def similarity(self, other, columns=similarity_columns, reference=None):
+
+        """
+        Returns the cosine similarity (between -1 and 1) between the mean standardised features of two sets of tracks
+        Features are standardised (centred & scaled) with the mean and standard deviation of a reference set of tracks,
+        so the similarity measures how the two sets differ from typical tracks in the same way.
+        :param other: another AudioFeatures
+        :param columns: the names of the features that are compared
+        :param reference: the AudioFeatures of a broad set of tracks (i.e a sample of the catalogue, or of many playlists).
+        It is required: standardised against their own tracks only, two sets always point in opposite directions.
+        """
+
+        if reference is None:
+            raise ValueError("Comparing two sets of tracks requires a reference set of tracks to standardise features")
+
+        return float(similarity_matrix([self, other], columns=columns, reference=reference)[0, 1])
+
+
+def similarity_matrix(feature_sets, columns=similarity_columns, reference=None):
+
+    """
+    Returns a matrix containing the cosine similarity between the mean standardised features of every pair of sets of
+    tracks (i.e between every pair of playlists)
+    Each feature is standardised with its mean & standard deviation across the tracks of a reference set, so
+    the similarity isn't dominated by features which are high for every track. Without centring, the means of
+    all-positive features point in nearly the same direction, and any two playlists seem similar.
+    :param feature_sets: a list of AudioFeatures
+    :param columns: the names of the features that are compared
+    :param reference: the AudioFeatures used to standardise the features. If None, the tracks of every set are used,
+    which requires at least 3 sets (centred on their own mean, 2 sets are always opposite).
+    """
+
+    if reference is None:
+        if len(feature_sets) < 3:
+            raise ValueError("Comparing fewer than 3 sets of tracks requires a reference set of tracks")
+        reference = AudioFeatures([track_id for features in feature_sets for track_id in features.track_ids],
+                                  np.vstack([features.matrix for features in feature_sets]))
+
+    indices = [feature_columns.index(feature) for feature in columns]
+    mean = reference.matrix[:, indices].mean(axis=0)
+    std = reference.matrix[:, indices].std(axis=0)
+    std[std == 0] = 1
+
+    centroids = (np.vstack([features.centroid(columns) for features in feature_sets]) - mean) / std
+    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+
+    unit_centroids = centroids / norms
+
+    return unit_centroids @ unit_centroids.T
+
+
+def get_track_ids(tracks):
+
+    """
+    Returns the ids of the tracks from any of:
+    - a list of track ids or URIs
+    - a search result (as returned by SptfySearchClient.search)
+    - a page of playlist tracks (as returned by SptfyPlaylistClient.get_playlist_tracks)
+    Local files, episodes and removed tracks are left out: they have no audio features, and a single invalid id
+    makes a whole request of 100 ids fail.
+    :param tracks: the tracks
+    """
+
+    if isinstance(tracks, dict):
+        if "tracks" in tracks:
+            tracks = tracks["tracks"]
+        if "uris" in tracks:
+            tracks = tracks["uris"]
+        else:
+            tracks = [item.get("track", item) for item in tracks.get("items", [])]
+            tracks = [track["id"] for track in tracks
+                      if track and track.get("id") and track.get("type", "track") == "track" and not track.get("is_local")]
+
+    track_ids = []
+
+    for track in tracks:
+        if ":" not in track:
+            track_ids.append(track)
+        elif track.startswith("spotify:track:"):
+            track_ids.append(track[len("spotify:track:"):])
+
+    return track_ids
+
+
+def get_audio_features(search_client, tracks, max_workers=4, attempts=3, retry_delay=1):
+
+    """
+    Returns the AudioFeatures of the given tracks, requesting 100 tracks at a time.
+    Tracks without audio features (which Spotify returns as null) are left out, and their number is printed.
+    Failed requests (i.e 429 or 5xx responses) are retried, waiting retry_delay seconds (doubled with each retry).
+    If a batch still fails, an Exception naming its tracks is raised, rather than leaving them out.
+    :param search_client: the SptfySearchClient used to make the requests
+    :param tracks: the tracks (see get_track_ids)
+    :param max_workers: the maximum number of requests sent at once
+    :param attempts: the number of times each batch is requested, if it keeps failing.
+    :param retry_delay: the number of seconds waited before the first retry.
+    """
+
+    track_ids = list(dict.fromkeys(get_track_ids(tracks)))
+    batches = [track_ids[i:i + 100] for i in range(0, len(track_ids), 100)]
+
+    def request(batch):
+        url = f"{search_client.base_url}/audio-features?{urlencode({'ids': ','.join(batch)})}"
+
+        for attempt in range(attempts):
+            response = search_client.get_json(url)  # an empty dictionary if the request failed
+            if "audio_features" in response:
+                return response["audio_features"]
+            if attempt == attempts - 1:
+                raise Exception(f"Could not get the audio features of {len(batch)} tracks: {', '.join(batch)}")
+            print(f"Could not get the audio features of {len(batch)} tracks. "
+                  f"Retrying in {retry_delay * 2 ** attempt} seconds")
+            time.sleep(retry_delay * 2 ** attempt)
+
+    search_client.get_access_token()  # every batch of 100 tracks is requested with this token
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        responses = list(executor.map(propagate(request), batches))
+
+    features = [feature for response in responses for feature in response if feature]
+
+    if len(features) < len(track_ids):
+        print(f"{len(track_ids) - len(features)} of {len(track_ids)} tracks have no audio features")
+
+    matrix = np.array([[feature[column] for column in feature_columns] for feature in features], dtype=np.float64)
+
+    return AudioFeatures([feature["id"] for feature in features], matrix)
+
+
+def get_playlist_audio_features(playlist_client, playlist_id, max_workers=4):
+
+    """
+    Returns the AudioFeatures of every track of a playlist
+    Raises an Exception if the playlist can't be read, or if the audio features of some of its tracks can't be requested
+    :param playlist_client: the SptfyPlaylistClient used to get the tracks of the playlist
+    :param playlist_id: the id of the playlist
+    :param max_workers: the maximum number of requests sent at once
+    """
+
+    uris = [uri for page in playlist_client.get_playlist_track_pages(playlist_id, projection="uris_only")
+            for uri in playlist_client.check_playlist_response(page, playlist_id)["uris"]]
+
+    return get_audio_features(playlist_client.get_search_client(), uris, max_workers=max_workers)
@@ -0,0 +1,315 @@
+import os  # used to read credentials from environment variables
+import sys  # used to exit with an error code
+import json  # used to read operations & write results as JSON lines
+import time  # used to time each operation
+import argparse  # used to parse command line arguments
+import threading  # used so that results from different threads are written one at a time
+import multiprocessing  # used to shard operations across processes
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED  # used to run operations at once
+
+from personal_data import PersonalData  # used to keep credentials in one place
+from spotify_transport import get_transport  # used to share a transport between the clients
+from shared_state import SharedTokenCache, SharedRateLimiter, RateLimitedTransport  # used to coordinate processes
+from spotify_search_client import SptfySearchClient  # used to search using the Spotify API
+from spotify_browse_client import SptfyBrowseClient  # used to access the browse tab
+from spotify_playlist_client import SptfyPlaylistClient  # used to work with playlists
+from browse_matrix import get_browse_matrix  # used to snapshot the browse tab of several markets
+
+# Runs a file of operations (one JSON object per line) on a pool of workers, i.e:
+# {"id": "1", "op": "search", "args": {"search_parameters": {"artist": "Avicii"}, "limit": 5}}
+# Results and failures are written as JSON lines, as soon as each operation finishes.
+#
+# Usage: python batch_runner.py operations.jsonl --results results.jsonl --failures failures.jsonl --workers 8
+# With --processes N, operations are sharded across N processes, which share their tokens & rate limit
+# through a SQLite database (--state-db).
+# Credentials are read from the SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_USER_ID & SPOTIFY_PASSWORD
+# environment variables (the last 2 are only needed to create & modify playlists).
+
+
+class BatchRunner:
+
+    """
+    Runs operations with a single set of clients, which share a transport and their tokens.
+    """
+
+    def __init__(self, personal_data, transport=None, workers=8, walkthrough_mode=False, token_cache=None):
+
+        """
+        personal_data: a PersonalData containing the credentials used by the clients.
+        transport: the transport shared by all the clients (see spotify_transport).
+        token_cache: a SharedTokenCache, used to share tokens with other processes (see shared_state). Optional.
+        workers: the number of operations run at once.
+        walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
+        operations: the functions that can be run, by name.
+        """
+
+        self.personal_data = personal_data
+        self.workers = workers
+        self.walkthrough_mode = walkthrough_mode
+
+        self.transport = transport if transport is not None else get_transport("http1", pool_size=workers)
+
+        self.search_client = SptfySearchClient(personal_data.client_id, personal_data.client_secret,
+                                               transport=self.transport, token_cache=token_cache)
+        self.browse_client = SptfyBrowseClient(personal_data.client_id, personal_data.client_secret,
+                                               transport=self.transport)
+        self.playlist_client = SptfyPlaylistClient(personal_data.client_id, personal_data.client_secret,
+                                                   transport=self.transport, token_cache=token_cache)
+
+        # a single search client (and token) for all the clients
+        self.browse_client.search_client = self.search_client
+        self.playlist_client.search_client = self.search_client
+
+        self.operations = {
+            "search": self.search_client.search,
+            "get_track": self.search_client.get_track,
+            "get_resource": self.search_client.get_resource,
+            "get_discography": lambda **args: list(self.search_client.get_discography(**args)),
+            "get_playlist": self.playlist_client.get_playlist,
+            "get_playlist_tracks": self.playlist_client.get_playlist_tracks,
+            "create_playlist": self.create_playlist,
+            "add_tracks": self.add_tracks,
+            "browse_snapshot": self.browse_snapshot,
+            "browse_matrix": lambda **args: get_browse_matrix(self.browse_client, **args)
+        }
+
+    def get_user_arguments(self):
+
+        """
+        Returns the arguments required by the playlist client to create & modify playlists.
+        """
+
+        if self.personal_data.user_id is None or self.personal_data.password is None:
+            raise ValueError("A user id and a password are required to create & modify playlists")
+
+        return {"user_id": self.personal_data.user_id, "password": self.personal_data.password,
+                "walkthrough_mode": self.walkthrough_mode}
+
+    def create_playlist(self, **args):
+        return self.playlist_client.create_playlist(**self.get_user_arguments(), **args)
+
+    def add_tracks(self, **args):
+        self.playlist_client.add_tracks_to_playlist(**self.get_user_arguments(), **args)
+        return {"playlist_id": args.get("playlist_id"), "added": len(args.get("tracks", []))}
+
+    def browse_snapshot(self, country=None, locale=None, limit=20):
+
+        """
+        Returns the category ids and new releases of the browse tab, for a country & locale
+        :param country: A country, shown as n ISO 3166-1 alpha-2 country code.
+        :param locale: The desired language, consisting of an ISO 639-1 language code and an ISO 3166-1 alpha-2 country code, joined by an underscore.
+        :param limit: The maximum number of categories & new releases to return. Default: 20. Minimum: 1. Maximum: 50.
+        """
+
+        return {
+            "categories": self.browse_client.get_category_ids(country=country, locale=locale, limit=limit),
+            "new_releases": self.browse_client.get_new_releases(country=country, limit=limit)
+        }
+
+    def run_operation(self, operation):
+
+        """
+        Runs a single operation, returning a result line, or raising an exception if it fails
+        :param operation: a dictionary with the name of the operation ("op"), its arguments ("args") and an optional "id"
+        """
+
+        if "invalid" in operation:
+            raise ValueError(f"Line {operation['line']} is not a valid operation ({operation['invalid']})")
+
+        name = operation.get("op")
+
+        if name not in self.operations:
+            raise ValueError(f"'{name}' is not a valid operation. Use one of: {list(self.operations)}")
+
+        start = time.perf_counter()
+        result = self.operations[name](**operation.get("args", {}))
+
+        return {"id": operation.get("id"), "op": name, "result": result,
+                "elapsed": round(time.perf_counter() - start, 4)}
+
+    def run(self, operations, results_file, failures_file):
+
+        """
+        Runs the operations on the pool of workers, writing each result or failure as soon as it finishes.
+        At most a few operations per worker are read ahead, so large files aren't held in memory.
+        Returns the number of results and the number of failures.
+        :param operations: an iterable of operations (see run_operation)
+        :param results_file: a file to which results are written as JSON lines
+        :param failures_file: a file to which failures (the operation and its error) are written as JSON lines
+        """
+
+        write_lock = threading.Lock()
+        counts = {"results": 0, "failures": 0}
+        max_pending = self.workers * 4
+
+        def run_and_write(operation):
+            try:
+                line = self.run_operation(operation)
+                kind, output_file = "results", results_file
+            except Exception as e:
+                line = {"operation": operation, "error": f"{type(e).__name__}: {e}"}
+                kind, output_file = "failures", failures_file
+
+            with write_lock:
+                output_file.write(json.dumps(line) + "\n")
+                output_file.flush()
+                counts[kind] += 1
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+
+            for operation in operations:
+                if len(pending) >= max_pending:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.add(executor.submit(run_and_write, operation))
+
+            wait(pending)
+
+        return counts["results"], counts["failures"]
+
+
+def read_operations(path, shard_index=0, shard_count=1):
+
+    """
+    Yields the operations of a JSON lines file, skipping empty lines
+    A line that isn't a JSON object is yielded as an invalid operation, with its line number, text & error
+    (i.e {"line": 12, "text": "{op: search", "invalid": "JSONDecodeError: ..."}), so run_operation records it
+    as a failure instead of stopping the whole batch.
+    :param path: the path of the file
+    :param shard_index: the shard to read. Only the operations on lines whose number % shard_count == shard_index are read.
+    :param shard_count: the number of shards the file is split into
+    """
+
+    with open(path) as f:
+        for line_number, line in enumerate(f):
+            if line_number % shard_count != shard_index or not line.strip():
+                continue
+
+            try:
+                operation = json.loads(line)
+            except ValueError as e:
+                yield {"line": line_number + 1, "text": line.rstrip("\n"), "invalid": f"{type(e).__name__}: {e}"}
+                continue
+
+            if not isinstance(operation, dict):
+                yield {"line": line_number + 1, "text": line.rstrip("\n"), "invalid": "not a JSON object"}
+                continue
+
+            yield operation
+
+
+def run_batch(personal_data, operations_path, results_path, failures_path, workers=8, transport_kind="http1",
+              shard_index=0, shard_count=1, state_db=None, rate=10):
+
+    """
+    Runs (a shard of) a file of operations, and returns the number of results and the number of failures
+    :param personal_data: a PersonalData containing the credentials used by the clients
+    :param operations_path: the JSON lines file of operations
+    :param results_path: the file to which results are written
+    :param failures_path: the file to which failures are written
+    :param workers: the number of operations run at once
+    :param transport_kind: either "http1" or "http2"
+    :param shard_index: the shard of the file to run
+    :param shard_count: the number of shards the file is split into
+    :param state_db: a SQLite database used to share tokens & the rate limit with other processes. Optional.
+    :param rate: the number of requests per second allowed across all processes (only used with state_db)
+    """
+
+    if transport_kind == "http1":
+        transport = get_transport("http1", pool_size=workers)
+    else:
+        transport = get_transport("http2")
+
+    token_cache = None
+
+    if state_db is not None:
+        token_cache = SharedTokenCache(state_db)
+        transport = RateLimitedTransport(transport, SharedRateLimiter(state_db, rate=rate, burst=rate))
+
+    runner = BatchRunner(personal_data, transport=transport, workers=workers, token_cache=token_cache)
+
+    with open(results_path, "w") as results_file, open(failures_path, "w") as failures_file:
+        return runner.run(read_operations(operations_path, shard_index, shard_count), results_file, failures_file)
+
+
+def run_shard(arguments):
+
+    """
+    Runs a shard within a worker process (see run_sharded)
+    :param arguments: a dictionary of arguments for run_batch
+    """
+
+    return run_batch(**arguments)
+
+
+def run_sharded(personal_data, operations_path, results_path, failures_path, processes, state_db, workers=8,
+                transport_kind="http1", rate=10):
+
+    """
+    Splits a file of operations into one shard per process, and runs the shards at once.
+    Processes share their tokens & rate limit through state_db, so N processes don't request N tokens,
+    nor exceed the rate limit together. Each shard writes its own files, which are then joined.
+    Returns the number of results and the number of failures.
+    :param processes: the number of processes
+    :param state_db: the SQLite database used to share tokens & the rate limit
+    (see run_batch for the other parameters)
+    """
+
+    shards = [{"personal_data": personal_data, "operations_path": operations_path,
+               "results_path": f"{results_path}.{index}", "failures_path": f"{failures_path}.{index}",
+               "workers": workers, "transport_kind": transport_kind, "shard_index": index,
+               "shard_count": processes, "state_db": state_db, "rate": rate}
+              for index in range(processes)]
+
+    with multiprocessing.Pool(processes) as pool:
+        counts = pool.map(run_shard, shards)
+
+    for path in [results_path, failures_path]:
+        with open(path, "w") as output_file:
+            for index in range(processes):
+                with open(f"{path}.{index}") as shard_file:
+                    output_file.writelines(shard_file)
+                os.remove(f"{path}.{index}")
+
+    return sum(count[0] for count in counts), sum(count[1] for count in counts)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Run a JSON lines file of Spotify client operations.")
+    parser.add_argument("operations", help="JSON lines file, with one operation per line")
+    parser.add_argument("--results", default="results.jsonl", help="file to which results are written")
+    parser.add_argument("--failures", default="failures.jsonl", help="file to which failures are written")
+    parser.add_argument("--workers", type=int, default=8, help="number of operations run at once (per process)")
+    parser.add_argument("--transport", choices=["http1", "http2"], default="http1", help="transport used by the clients")
+    parser.add_argument("--processes", type=int, default=1, help="number of processes the operations are sharded across")
+    parser.add_argument("--state-db", default="batch_state.db",
+                        help="SQLite database used by processes to share tokens & the rate limit")
+    parser.add_argument("--rate", type=float, default=10, help="requests per second allowed across all processes")
+    args = parser.parse_args(argv)
+
+    client_id = os.environ.get("SPOTIFY_CLIENT_ID")
+    client_secret = os.environ.get("SPOTIFY_CLIENT_SECRET")
+
+    if client_id is None or client_secret is None:
+        sys.exit("SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET must be set")
+
+    personal_data = PersonalData(client_id, client_secret, os.environ.get("SPOTIFY_USER_ID"),
+                                 os.environ.get("SPOTIFY_PASSWORD"))
+
+    if args.processes > 1:
+        results, failures = run_sharded(personal_data, args.operations, args.results, args.failures,
+                                        processes=args.processes, state_db=args.state_db, workers=args.workers,
+                                        transport_kind=args.transport, rate=args.rate)
+    else:
+        results, failures = run_batch(personal_data, args.operations, args.results, args.failures,
+                                      workers=args.workers, transport_kind=args.transport)
+
+    print(f"{results} operation(s) succeeded, {failures} operation(s) failed")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
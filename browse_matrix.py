@@ -0,0 +1,144 @@
+import json  # used to write payloads as canonical JSON, to find identical ones
+import hashlib  # used to identify payloads by the hash of their canonical JSON
+
+from concurrent.futures import ThreadPoolExecutor  # used to request every market at once
+
+from spotify_deadline import propagate  # used to give the market requests the current_deadline of the caller
+
+# A snapshot of the browse tab across markets (every combination of countries & locales):
+# the category ids, the metadata of each category, and the new releases.
+# Requests are made at once (up to max_workers at a time), and each distinct request is only made once:
+# new releases don't depend on the locale, so they are requested once per country.
+#
+# Many markets share the same content (i.e the same categories in every English speaking country).
+# Payloads are identified by the hash of their canonical JSON (sorted keys, without the paging links, which contain
+# the country & locale of the request), and each distinct payload is stored once. Each market refers to its payloads
+# by hash:
+# {"payloads": {hash: payload},
+#  "markets": {"GB:en_GB": {"country": "GB", "locale": "en_GB", "categories": hash, "new_releases": hash,
+#                           "category_details": {category_id: hash}}}}
+# A reference is None if its request failed.
+
+paging_links = ("href", "next", "previous")
+
+
+def get_market_key(country, locale=None):
+    return f"{country}:{locale or ''}"
+
+
+def get_canonical_json(payload):
+
+    """
+    Returns the JSON of a payload with sorted keys & no spaces, without the links of its paging objects
+    (which contain the country & locale of the request), so payloads with the same content have the same JSON
+    :param payload: the JSON of a response
+    """
+
+    def strip(value):
+        if isinstance(value, dict):
+            return {key: strip(item) for key, item in value.items()
+                    if not ("items" in value and key in paging_links)}
+        if isinstance(value, list):
+            return [strip(item) for item in value]
+        return value
+
+    return json.dumps(strip(payload), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def get_payload_hash(payload):
+    return hashlib.sha1(get_canonical_json(payload).encode()).hexdigest()
+
+
+def get_browse_matrix(browse_client, countries, locales=(None,), limit=20, category_details=False, max_workers=16):
+
+    """
+    Requests the category ids, category metadata & new releases of every combination of countries & locales at once,
+    and returns them with each distinct payload stored once (see the structure above)
+    :param browse_client: the SptfyBrowseClient used to make the requests
+    :param countries: a list of ISO 3166-1 alpha-2 country codes
+    :param locales: a list of locales (i.e ["en_GB", "es_ES"]). None requests the default locale.
+    :param limit: the number of categories & new releases requested for each market. Maximum: 50.
+    :param category_details: whether each category is also requested on its own (get_category). Otherwise, the metadata
+    of each category is taken from the list of categories, which holds the same category objects.
+    :param max_workers: the maximum number of requests made at once
+    """
+
+    browse_client.get_access_token()  # every market is requested with this token
+
+    payloads = {}
+    markets = {get_market_key(country, locale): {"country": country, "locale": locale, "categories": None,
+                                                 "new_releases": None, "category_details": {}}
+               for country in countries for locale in locales}
+
+    def request(url):
+        payload, _ = browse_client.get_if_changed(url)
+        return None if payload is None else (get_payload_hash(payload), payload)
+
+    def store(response):
+        if response is None:
+            return None
+        payload_hash, payload = response
+        payloads.setdefault(payload_hash, payload)
+        return payload_hash
+
+    def get_category_url(category_id, country, locale):
+        return browse_client.get_request_url(base_url=f"{browse_client.categories_url}/{category_id}",
+                                             category_query="get_category", country=country, locale=locale)
+
+    category_urls = {key: browse_client.get_request_url(base_url=browse_client.categories_url, category_query="get_ids",
+                                                        country=market["country"], locale=market["locale"],
+                                                        limit=limit)
+                     for key, market in markets.items()}
+    release_urls = {country: browse_client.get_request_url(base_url=browse_client.releases_url,
+                                                           category_query="get_releases", country=country, limit=limit)
+                    for country in countries}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        release_futures = {country: executor.submit(propagate(request), url) for country, url in release_urls.items()}
+        category_futures = {key: executor.submit(propagate(request), url) for key, url in category_urls.items()}
+
+        detail_futures = {}
+
+        for key, future in category_futures.items():
+            response = future.result()
+            markets[key]["categories"] = store(response)
+
+            if response is None:
+                continue
+
+            market = markets[key]
+            for category in response[1].get("categories", {}).get("items", []):
+                if category_details:
+                    url = get_category_url(category["id"], market["country"], market["locale"])
+                    detail_futures[key, category["id"]] = executor.submit(propagate(request), url)
+                else:
+                    market["category_details"][category["id"]] = store((get_payload_hash(category), category))
+
+        for (key, category_id), future in detail_futures.items():
+            markets[key]["category_details"][category_id] = store(future.result())
+
+        for country, future in release_futures.items():
+            payload_hash = store(future.result())
+            for locale in locales:
+                markets[get_market_key(country, locale)]["new_releases"] = payload_hash
+
+    print(f"Browse matrix of {len(markets)} markets: {len(payloads)} distinct payloads")
+
+    return {"payloads": payloads, "markets": markets}
+
+
+def get_market_payload(matrix, country, locale=None, kind="categories", category_id=None):
+
+    """
+    Returns a payload of a market from a browse matrix, or None if its request failed
+    :param matrix: the browse matrix returned by get_browse_matrix
+    :param country: an ISO 3166-1 alpha-2 country code
+    :param locale: the locale of the market (i.e "en_GB")
+    :param kind: either "categories", "new_releases" or "category_details"
+    :param category_id: the id of the category, for "category_details"
+    """
+
+    market = matrix["markets"][get_market_key(country, locale)]
+    payload_hash = market[kind] if kind != "category_details" else market[kind].get(category_id)
+
+    return matrix["payloads"].get(payload_hash)
@@ -0,0 +1,260 @@
+import math  # used to size Bloom filters
+
+from array import array  # used to store ids as 64-bit integers, without a Python object per id
+
+# Spotify ids (i.e "1vCWHaC5f2uS3yhpwWbIA6") are 128-bit numbers written in base 62 (22 characters).
+# As Python strings (inside sets & dictionaries), each one takes over 100 bytes.
+# Stored as a pair of 64-bit integers in arrays, each one takes 16 bytes (plus its slot in a hash table).
+
+alphabet = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+digits = {character: value for value, character in enumerate(alphabet)}
+id_length = 22
+mask = (1 << 64) - 1
+
+
+def encode_id(spotify_id):
+
+    """
+    Returns the 128-bit integer of a Spotify id
+    Raises ValueError if the id isn't a valid Spotify id
+    :param spotify_id: a base 62 Spotify id (i.e "1vCWHaC5f2uS3yhpwWbIA6")
+    """
+
+    if len(spotify_id) != id_length:
+        raise ValueError(f"'{spotify_id}' is not a valid Spotify id")
+
+    value = 0
+
+    try:
+        for character in spotify_id:
+            value = value * 62 + digits[character]
+    except KeyError:
+        raise ValueError(f"'{spotify_id}' is not a valid Spotify id")
+
+    if value >> 128:
+        raise ValueError(f"'{spotify_id}' is not a valid Spotify id")
+
+    return value
+
+
+def decode_id(value):
+
+    """
+    Returns the Spotify id of a 128-bit integer (the reverse of encode_id)
+    :param value: the integer
+    """
+
+    characters = []
+
+    for _ in range(id_length):
+        value, digit = divmod(value, 62)
+        characters.append(alphabet[digit])
+
+    return "".join(reversed(characters))
+
+
+class IdTable:
+
+    """
+    A set of Spotify ids, stored as 128-bit integers in arrays.
+    Each id also gets a number (the order in which it was added), so ids can be referred to by a small integer
+    (i.e in edge lists), and data about them can be kept in arrays of the same length.
+    Ids are found through an open addressing hash table of numbers.
+    """
+
+    def __init__(self, ids=(), capacity=1024):
+
+        """
+        ids: ids to add to the table.
+        capacity: the number of ids the table can hold before it grows.
+        high, low: the upper & lower 64 bits of each id, in the order they were added.
+        slots: the hash table, holding the number (plus 1) of the id in each slot. 0 is an empty slot.
+        """
+
+        self.high = array("Q")
+        self.low = array("Q")
+        self.slots = array("q", bytes(8 * self.get_slot_count(capacity)))
+
+        for spotify_id in ids:
+            self.add(spotify_id)
+
+    @staticmethod
+    def get_slot_count(capacity):
+
+        # the table is kept at most half full, and has a power of 2 slots
+        return 1 << max(4, (2 * capacity - 1).bit_length())
+
+    def __len__(self):
+        return len(self.low)
+
+    def __contains__(self, spotify_id):
+        return self.get_number(spotify_id) is not None
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self.get_id(number)
+
+    def find_slot(self, high, low):
+
+        """
+        Returns the slot holding an id, or the empty slot where it would go
+        """
+
+        slot_mask = len(self.slots) - 1
+        slot = (low ^ (high >> 7)) & slot_mask
+
+        while True:
+            number = self.slots[slot] - 1
+            if number < 0 or (self.low[number] == low and self.high[number] == high):
+                return slot
+            slot = (slot + 1) & slot_mask
+
+    def get_number(self, spotify_id):
+
+        """
+        Returns the number of an id, or None if it isn't in the table
+        :param spotify_id: a Spotify id
+        """
+
+        value = encode_id(spotify_id)
+        number = self.slots[self.find_slot(value >> 64, value & mask)] - 1
+
+        return number if number >= 0 else None
+
+    def get_id(self, number):
+
+        """
+        Returns the id with a number
+        :param number: the number of the id (the order in which it was added)
+        """
+
+        return decode_id((self.high[number] << 64) | self.low[number])
+
+    def add(self, spotify_id):
+
+        """
+        Adds an id to the table (unless it is already there), and returns its number
+        :param spotify_id: a Spotify id
+        """
+
+        value = encode_id(spotify_id)
+
+        return self.add_value(value >> 64, value & mask)
+
+    def add_value(self, high, low):
+
+        """
+        Adds an id, as the upper & lower 64 bits of its integer, to the table (unless it is already there),
+        and returns its number
+        """
+
+        slot = self.find_slot(high, low)
+        if self.slots[slot]:
+            return self.slots[slot] - 1
+
+        self.high.append(high)
+        self.low.append(low)
+        self.slots[slot] = len(self.low)
+
+        if 2 * len(self.low) > len(self.slots):
+            self.grow()
+
+        return len(self.low) - 1
+
+    def get_values(self, start=0):
+
+        """
+        Returns the ids from a number onwards as an array of 64-bit integers (the upper & lower 64 bits of each id,
+        in turn), which can be written to a file as is (see array.tofile)
+        :param start: the number of the first id
+        """
+
+        values = array("Q", bytes(16 * (len(self) - start)))
+        values[0::2] = self.high[start:]
+        values[1::2] = self.low[start:]
+
+        return values
+
+    def add_values(self, values):
+
+        """
+        Adds the ids of an array returned by get_values, in order
+        :param values: an array of 64-bit integers (the upper & lower 64 bits of each id, in turn)
+        """
+
+        for high, low in zip(values[0::2], values[1::2]):
+            self.add_value(high, low)
+
+    def grow(self):
+
+        """
+        Doubles the number of slots of the hash table, and places every id again
+        """
+
+        self.slots = array("q", bytes(16 * len(self.slots)))
+
+        for number in range(len(self.low)):
+            self.slots[self.find_slot(self.high[number], self.low[number])] = number + 1
+
+    def get_size(self):
+
+        """
+        Returns the memory (in bytes) used by the arrays of the table
+        """
+
+        return sum(a.itemsize * len(a) for a in (self.high, self.low, self.slots))
+
+
+class BloomSet:
+
+    """
+    A set of Spotify ids, which uses a fixed (small) amount of memory, but can be wrong about ids it doesn't hold:
+    "spotify_id in bloom_set" is always True for an added id, and True for a fraction (error_rate) of other ids.
+    Useful to skip ids that were probably seen before (i.e in a catalogue-wide crawl), when missing a few is acceptable.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+
+        """
+        capacity: the number of ids the set is sized for. Adding more increases the error rate.
+        error_rate: the fraction of ids that weren't added, which the set wrongly holds (once it holds capacity ids).
+        bits: the number of bits of the filter.
+        hashes: the number of bits set for each id.
+        """
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.filter = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def get_positions(self, spotify_id):
+
+        """
+        Returns the bits of an id. Spotify ids are random, so the two halves of an id are used as hashes.
+        """
+
+        value = encode_id(spotify_id)
+        first, second = value & mask, (value >> 64) | 1
+
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, spotify_id):
+        return all(self.filter[position >> 3] & (1 << (position & 7)) for position in self.get_positions(spotify_id))
+
+    def add(self, spotify_id):
+
+        """
+        Adds an id to the set
+        :param spotify_id: a Spotify id
+        """
+
+        for position in self.get_positions(spotify_id):
+            self.filter[position >> 3] |= 1 << (position & 7)
+
+        self.count += 1
@@ -0,0 +1,207 @@
+import time  # used to take throttled credentials out of rotation for a while
+import threading  # used so that threads sharing the pool see a consistent state
+
+from spotify_transport import RequestsTransport  # used to make requests
+from spotify_deadline import get_deadline, accepts_deadline, DeadlineExceeded  # used to bound waits & requests
+from spotify_search_client import SptfySearchClient  # used to obtain a token for each credential
+
+
+class PooledCredential:
+
+    """
+    The token and rate-limit state of a single app registration (client_id/client_secret) within a CredentialPool.
+    """
+
+    def __init__(self, client_id, client_secret, transport):
+
+        """
+        search_client: the SptfySearchClient holding the token of this credential.
+        in_flight: the number of requests currently using this credential.
+        requests: the number of requests made with this credential.
+        throttled: the number of requests that were rate limited (status code 429).
+        strikes: the number of consecutive requests that were rate limited.
+        available_at: the time (time.monotonic) from which the credential can be used again.
+        """
+
+        self.client_id = client_id
+        self.search_client = SptfySearchClient(client_id, client_secret, transport = transport)
+
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.strikes = 0
+        self.available_at = 0
+
+    def get_load(self):
+
+        """
+        Returns a key used to sort credentials, from least to most throttled
+        Ties are broken by the number of requests made, so the load is spread across credentials
+        """
+
+        return (self.strikes, self.in_flight, self.throttled / (self.requests + 1), self.requests)
+
+
+class CredentialPool:
+
+    """
+    Holds the credentials of several app registrations, each with its own token and rate-limit state.
+    Read-only requests are sent using the least throttled credential,
+    so the throughput isn't capped by the rate limit of a single app.
+    """
+
+    def __init__(self, credentials, transport = None, max_strikes = 3, cooldown = 60):
+
+        """
+        credentials: a list of (client_id, client_secret) tuples.
+        transport: the transport shared by every credential (see spotify_transport).
+        max_strikes: the number of consecutive 429 responses after which a credential is taken out of rotation.
+        cooldown: the number of seconds a credential is out of rotation for.
+        """
+
+        if not credentials:
+            raise ValueError("A credential pool requires at least one credential")
+
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.max_strikes = max_strikes
+        self.cooldown = cooldown
+
+        self.credentials = [PooledCredential(client_id, client_secret, self.transport)
+                            for client_id, client_secret in credentials]
+        self.lock = threading.Lock()
+
+    def acquire(self):
+
+        """
+        Returns the least throttled credential that is in rotation, marking it as in use.
+        If every credential is out of rotation, waits until one of them is back.
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                available = [credential for credential in self.credentials if credential.available_at <= now]
+
+                if available:
+                    credential = min(available, key = PooledCredential.get_load)
+                    credential.in_flight += 1
+                    return credential
+
+                wait = min(credential.available_at for credential in self.credentials) - now
+
+            deadline = get_deadline()
+            if deadline is not None and deadline.get_remaining() < wait:
+                raise DeadlineExceeded(f"Every credential is rate limited for longer than the deadline ({wait:.1f} seconds)")
+
+            print(f"Every credential is rate limited. Waiting {wait:.1f} seconds")
+            time.sleep(wait)
+
+    def release(self, credential, response):
+
+        """
+        Updates the rate-limit state of a credential, once a request using it has finished
+        A credential receiving a 429 response isn't used until the "Retry-After" time has passed,
+        and after max_strikes consecutive 429 responses, it is taken out of rotation for "cooldown" seconds
+        :param credential: the credential used for the request
+        :param response: the response of the request (None if the request failed)
+        """
+
+        with self.lock:
+            credential.in_flight -= 1
+            credential.requests += 1
+
+            if response is None or response.status_code != 429:
+                credential.strikes = 0
+                return
+
+            credential.throttled += 1
+            credential.strikes += 1
+
+            retry_after = float(response.headers.get("Retry-After", 1))
+
+            if credential.strikes >= self.max_strikes:
+                retry_after = max(retry_after, self.cooldown)
+                print(f"Credential {credential.client_id} was rate limited {credential.strikes} times in a row. "
+                      f"Taking it out of rotation for {retry_after} seconds")
+
+            credential.available_at = time.monotonic() + retry_after
+
+    def get_response(self, url):
+
+        """
+        Makes a GET request using the least throttled credential, and returns the response
+        Rate limited requests are retried (with another credential, if one is available),
+        up to once per credential in the pool
+        :param url: the url of the request
+        """
+
+        for attempt in range(len(self.credentials) + 1):
+            credential = self.acquire()
+            response = None
+
+            try:
+                response = self.transport.get(url, headers = credential.search_client.get_request_header())
+            finally:
+                self.release(credential, response)
+
+            if response.status_code != 429:
+                break
+
+        return response
+
+    def get_access_tokens(self):
+
+        """
+        Requests the token of every credential (i.e before threads need them), and returns them
+        """
+
+        return [credential.search_client.get_access_token() for credential in self.credentials]
+
+    def get_stats(self):
+
+        """
+        Returns the number of requests, rate limited requests & whether it is in rotation, for every credential
+        """
+
+        now = time.monotonic()
+
+        with self.lock:
+            return {credential.client_id: {"requests": credential.requests, "throttled": credential.throttled,
+                                           "in_rotation": credential.available_at <= now}
+                    for credential in self.credentials}
+
+
+class PooledSearchClient(SptfySearchClient):
+
+    """
+    A SptfySearchClient whose requests are sent through a CredentialPool.
+    It can be used wherever a SptfySearchClient is used for reading (searching, resources, crawls, exports, ...).
+    """
+
+    def __init__(self, pool):
+
+        """
+        pool: the CredentialPool used to send requests.
+        """
+
+        first_credential = pool.credentials[0]
+
+        super().__init__(first_credential.client_id, first_credential.search_client.client_secret,
+                         transport = pool.transport)
+        self.pool = pool
+
+    @accepts_deadline
+    def get_access_token(self):
+
+        """
+        Requests the token of every credential of the pool, and returns the token of the least throttled one
+        """
+
+        tokens = self.pool.get_access_tokens()
+        least_throttled = min(self.pool.credentials, key = PooledCredential.get_load)
+
+        return tokens[self.pool.credentials.index(least_throttled)]
+
+    @accepts_deadline
+    def get_response(self, url):
+        return self.pool.get_response(url)
@@ -0,0 +1,58 @@
+import sys  # used to run the same Python interpreter
+import time  # used to time each import
+import argparse  # used to parse command line arguments
+import statistics  # used to get the median time
+import subprocess  # used to import each module in a fresh process
+
+# Measures the time it takes a fresh process to import each module (and, optionally, create its client),
+# so changes to the imports of the clients can be compared.
+#
+# Usage: python import_benchmark.py --runs 20
+
+benchmarks = {
+    "spotify_search_client": "import spotify_search_client",
+    "spotify_playlist_client": "import spotify_playlist_client",
+    "spotify_browse_client": "import spotify_browse_client",
+    "search client (created)": "import spotify_search_client as m; m.SptfySearchClient('id', 'secret')",
+    "playlist client (created)": "import spotify_playlist_client as m; m.SptfyPlaylistClient('id', 'secret')",
+    "browse client (created)": "import spotify_browse_client as m; m.SptfyBrowseClient('id', 'secret')"
+}
+
+
+def time_statement(statement, runs=10):
+
+    """
+    Returns the time (in milliseconds) taken by each run of a statement, each run in a fresh process.
+    The time taken by an empty process is subtracted.
+    :param statement: the Python statement to run
+    :param runs: the number of runs
+    """
+
+    def run(code):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        return (time.perf_counter() - start) * 1000
+
+    baseline = statistics.median(run("pass") for _ in range(runs))
+
+    return [run(statement) - baseline for _ in range(runs)]
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Measure the startup time of the Spotify clients.")
+    parser.add_argument("--runs", type=int, default=10, help="number of runs for each benchmark")
+    args = parser.parse_args(argv)
+
+    for name, statement in benchmarks.items():
+        try:
+            times = time_statement(statement, runs=args.runs)
+        except subprocess.CalledProcessError:
+            print(f"{name}: failed")
+            continue
+
+        print(f"{name}: median {statistics.median(times):.1f} ms, min {min(times):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import json  # used to store the arguments & results of jobs and steps
+import time  # used to record when jobs are submitted & updated
+import uuid  # used to name jobs submitted without an id
+import sqlite3  # used to keep jobs & their progress on disk
+import threading  # used so that the threads running a job don't use the connection at once
+
+from concurrent.futures import ThreadPoolExecutor  # used to resolve the song names of a job at once
+
+from spotify_deadline import propagate  # used so the search threads keep the current_deadline of whoever runs the job
+
+# Bulk operations (i.e adding thousands of songs to a playlist) run as jobs, kept in a local SQLite database.
+# A job is split into named steps (i.e "resolve:Stan", "post:0"), and the result of each step is saved as soon as
+# the step completes. If the process crashes (or a request fails), running the job again skips the completed steps,
+# and uses their saved results, so the job resumes where it stopped instead of repeating requests (or adding duplicates).
+#
+# A step is marked as started before it runs. A step which was started but never completed may or may not have
+# taken effect (i.e the process crashed after a POST was sent, but before its response was saved). Such steps are
+# verified before they are run again, if the job provides a way to check them.
+#
+# Job arguments are saved as JSON, so they must not contain credentials: clients, user ids & passwords are passed
+# when the jobs are run instead.
+
+
+def connect(db_path):
+
+    """
+    Returns a connection to the job database, creating its tables if needed
+    :param db_path: the path of the SQLite database
+    """
+
+    connection = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT, args TEXT, status TEXT, "
+                       "result TEXT, error TEXT, submitted_at REAL, updated_at REAL)")
+    connection.execute("CREATE TABLE IF NOT EXISTS steps (job_id TEXT, name TEXT, status TEXT, result TEXT, "
+                       "updated_at REAL, PRIMARY KEY (job_id, name))")
+
+    return connection
+
+
+class Job:
+
+    """
+    A job being run, through which its steps are checkpointed.
+    """
+
+    def __init__(self, queue, job_id, kind, args):
+
+        """
+        queue: the JobQueue the job belongs to.
+        job_id: the id of the job.
+        kind: the name of the function running the job (see JobQueue.register).
+        args: the arguments of the job.
+        """
+
+        self.queue = queue
+        self.job_id = job_id
+        self.kind = kind
+        self.args = args
+
+    def get_step(self, name):
+
+        """
+        Returns the (status, result) tuple of a step, or None if the step was never started
+        :param name: the name of the step
+        """
+
+        with self.queue.lock:
+            row = self.queue.connection.execute("SELECT status, result FROM steps WHERE job_id = ? AND name = ?",
+                                                (self.job_id, name)).fetchone()
+
+        return None if row is None else (row[0], json.loads(row[1]) if row[1] is not None else None)
+
+    def set_step(self, name, status, result=None):
+        with self.queue.lock:
+            self.queue.connection.execute("INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?)",
+                                          (self.job_id, name, status, json.dumps(result), time.time()))
+
+    def step(self, name, function, verify=None):
+
+        """
+        Runs a step of the job, and saves its result. Returns the result of the step.
+        If the step was already completed (i.e before a crash), it isn't run again, and its saved result is returned.
+        If the step was started but not completed, verify is called first (if given): it returns the result of the step
+        if the step took effect, or None if it didn't, in which case the step is run again.
+        :param name: the name of the step, unique within the job (i.e "post:3")
+        :param function: a function running the step, which returns its result (which must be JSON serializable)
+        :param verify: a function checking whether a started step took effect. Optional.
+        """
+
+        step = self.get_step(name)
+
+        if step is not None and step[0] == "done":
+            return step[1]
+
+        if step is not None and verify is not None:
+            result = verify()
+            if result is not None:
+                print(f"Step '{name}' of job {self.job_id} had taken effect before the job stopped")
+                self.set_step(name, "done", result)
+                return result
+
+        self.set_step(name, "started")
+        result = function()
+        self.set_step(name, "done", result)
+
+        return result
+
+
+class JobQueue:
+
+    """
+    Jobs kept in a local SQLite database, which can be resumed after a crash.
+    """
+
+    def __init__(self, db_path):
+
+        """
+        db_path: the path of the SQLite database.
+        job_functions: the functions running each kind of job, by name.
+        """
+
+        self.db_path = db_path
+        self.connection = connect(db_path)
+        self.lock = threading.Lock()
+
+        self.job_functions = {"add_tracks": add_tracks_job}
+
+    def register(self, kind, function):
+
+        """
+        Adds a kind of job
+        :param kind: the name of the kind of job (i.e "add_tracks")
+        :param function: the function running the job. It is called with the Job, the arguments of the job,
+        and the keyword arguments given to run (i.e clients & credentials).
+        """
+
+        self.job_functions[kind] = function
+
+    def submit(self, kind, args, job_id=None):
+
+        """
+        Adds a job to the queue, and returns its id
+        A job that was already submitted with the same id isn't added again, so a script submitting its jobs can be
+        run again after a crash.
+        :param kind: the kind of job (see register)
+        :param args: the arguments of the job, as a JSON serializable dictionary
+        :param job_id: the id of the job. If None, a random id is used.
+        """
+
+        if kind not in self.job_functions:
+            raise ValueError(f"'{kind}' is not a kind of job. Use register to add it")
+
+        job_id = job_id if job_id is not None else uuid.uuid4().hex
+        now = time.time()
+
+        with self.lock:
+            self.connection.execute("INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, 'pending', NULL, NULL, ?, ?)",
+                                    (job_id, kind, json.dumps(args), now, now))
+
+        return job_id
+
+    def get_job(self, job_id):
+
+        """
+        Returns the status, result & error of a job as a dictionary, or None if there is no job with that id
+        :param job_id: the id of the job
+        """
+
+        with self.lock:
+            row = self.connection.execute("SELECT kind, status, result, error FROM jobs WHERE id = ?",
+                                          (job_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        return {"id": job_id, "kind": row[0], "status": row[1],
+                "result": json.loads(row[2]) if row[2] is not None else None, "error": row[3]}
+
+    def get_unfinished_jobs(self):
+
+        """
+        Returns the ids of the jobs that haven't completed (pending, interrupted or failed), the oldest first
+        """
+
+        with self.lock:
+            rows = self.connection.execute("SELECT id FROM jobs WHERE status != 'done' ORDER BY submitted_at, rowid")
+            return [row[0] for row in rows.fetchall()]
+
+    def set_job(self, job_id, status, result=None, error=None):
+        with self.lock:
+            self.connection.execute("UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                                    (status, json.dumps(result), error, time.time(), job_id))
+
+    def run(self, job_id, **context):
+
+        """
+        Runs (or resumes) a job, and returns its result. Steps completed by an earlier run are skipped.
+        If the job fails, the error is saved and raised again; running the job again resumes it.
+        :param job_id: the id of the job
+        :param context: keyword arguments passed to the function running the job, which aren't saved
+        (i.e playlist_client, user_id & password)
+        """
+
+        with self.lock:
+            row = self.connection.execute("SELECT kind, args, status, result FROM jobs WHERE id = ?",
+                                          (job_id,)).fetchone()
+
+        if row is None:
+            raise ValueError(f"There is no job with id {job_id}")
+
+        kind, args, status, result = row
+
+        if status == "done":
+            return json.loads(result)
+
+        job = Job(self, job_id, kind, json.loads(args))
+        self.set_job(job_id, "running")
+
+        try:
+            result = self.job_functions[kind](job, **job.args, **context)
+        except BaseException as e:
+            self.set_job(job_id, "failed", error=f"{type(e).__name__}: {e}")
+            raise
+
+        self.set_job(job_id, "done", result=result)
+        print(f"Job {job_id} ({kind}) done")
+
+        return result
+
+    def run_unfinished(self, **context):
+
+        """
+        Runs (or resumes) every job that hasn't completed, one at a time. Returns the results of the jobs by id.
+        A job that fails doesn't stop the others: its error is saved, and it is left out of the results.
+        :param context: keyword arguments passed to the functions running the jobs (see run)
+        """
+
+        results = {}
+
+        for job_id in self.get_unfinished_jobs():
+            try:
+                results[job_id] = self.run(job_id, **context)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+
+        return results
+
+    def close(self):
+        self.connection.close()
+
+
+def add_tracks_job(job, playlist_client, user_id, password, playlist_id, tracks, walkthrough_mode=False,
+                   max_workers=8):
+
+    """
+    Resumable version of SptfyPlaylistClient.add_tracks_to_playlist, run as a job. Steps:
+    - "resolve:<song name>": the URI of each song (searched for at once).
+    - "start": the number of tracks in the playlist before any track was added.
+    - "post:<i>": the snapshot_id after adding the i-th chunk of 100 tracks. A chunk whose POST may have been sent
+    before a crash is checked against the playlist (the tracks expected at its position) before it is sent again.
+    Returns the final snapshot_id, the number of tracks added & the song names with no search results.
+    :param job: the Job being run
+    :param playlist_client: the SptfyPlaylistClient used to search for the songs & modify the playlist
+    :param user_id: the username of the Spotify Account that owns the playlist.
+    :param password: the password of the Spotify Account that owns the playlist.
+    :param playlist_id: the id of the playlist.
+    :param tracks: a list of song names to be added to the playlist
+    :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
+    :param max_workers: the maximum number of searches made at once.
+    """
+
+    s = playlist_client.get_search_client()
+    s.get_access_token()  # the songs of the job are searched for with this token
+
+    def search(track):
+        # only a search with no results is saved as missing. A failed search raises, so the step stays started
+        # (and the job fails), and the song is searched for again when the job is resumed.
+        try:
+            return s.get_track(track)
+        except IndexError:
+            print(f"No track found for '{track}'")
+            return None
+
+    def resolve(track):
+        return job.step(f"resolve:{track}", lambda: search(track))
+
+    names = list(dict.fromkeys(tracks))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        uris = dict(zip(names, executor.map(propagate(resolve), names)))
+
+    token = playlist_client.get_token(user_id=user_id, password=password, walkthrough_mode=walkthrough_mode)
+
+    def count():
+        summary = playlist_client.get_playlist(playlist_id, projection="summary", token=token)
+        return playlist_client.check_playlist_response(summary, playlist_id)["total"]
+
+    start = job.step("start", count)
+
+    uri_tracks = [uris[track] for track in tracks if uris[track] is not None]
+    snapshot_id = None
+
+    for i in range(0, len(uri_tracks), 100):
+        chunk = uri_tracks[i:i + 100]
+
+        def post():
+            return playlist_client.add_uris_to_playlist(user_id, password, playlist_id, chunk,
+                                                        walkthrough_mode=walkthrough_mode)
+
+        def verify():
+            # the chunk took effect if its tracks are in the playlist, where they would have been added.
+            # Tracks are read raw rather than "uris_only", which drops unavailable (null) tracks and would shift
+            # the positions being compared.
+            window = playlist_client.get_playlist_tracks(playlist_id, limit=len(chunk), offset=start + i,
+                                                         projection="items(track(uri))", token=token)
+            items = playlist_client.check_playlist_response(window, playlist_id).get("items", [])
+            added = [item["track"]["uri"] if item.get("track") else None for item in items]
+            if added != chunk:
+                return None
+            return playlist_client.get_snapshot_id(playlist_id, token=token)
+
+        snapshot_id = job.step(f"post:{i // 100}", post, verify=verify)
+
+    return {"snapshot_id": snapshot_id, "added": len(uri_tracks),
+            "missing": [track for track in names if uris[track] is None]}
@@ -0,0 +1,313 @@
+import pyarrow as pa  # used to build columnar record batches
+import pyarrow.parquet as pq  # used to write & read Parquet files
+
+# Exports results (tracks, albums or artists) to Parquet files, one page of results at a time.
+# Every page is flattened into an Arrow record batch, and batches are buffered until they fill a row group
+# (row_group_size rows), which is then written. Pages hold 50 - 100 rows: writing each one as its own row group would
+# bloat the file's metadata, compress poorly and make the column statistics useless for skipping row groups.
+# Only one row group is ever held in memory, not the full result set.
+
+string_list = pa.list_(pa.string())
+
+schemas = {
+    "tracks": pa.schema([
+        ("track_id", pa.string()),
+        ("track_name", pa.string()),
+        ("track_uri", pa.string()),
+        ("duration_ms", pa.int64()),
+        ("explicit", pa.bool_()),
+        ("popularity", pa.int32()),
+        ("track_number", pa.int32()),
+        ("disc_number", pa.int32()),
+        ("isrc", pa.string()),
+        ("album_id", pa.string()),
+        ("album_name", pa.string()),
+        ("album_type", pa.string()),
+        ("album_release_date", pa.string()),
+        ("artist_ids", string_list),
+        ("artist_names", string_list),
+        ("added_at", pa.string())
+    ]),
+    "albums": pa.schema([
+        ("album_id", pa.string()),
+        ("album_name", pa.string()),
+        ("album_uri", pa.string()),
+        ("album_type", pa.string()),
+        ("release_date", pa.string()),
+        ("total_tracks", pa.int32()),
+        ("artist_ids", string_list),
+        ("artist_names", string_list)
+    ]),
+    "artists": pa.schema([
+        ("artist_id", pa.string()),
+        ("artist_name", pa.string()),
+        ("artist_uri", pa.string()),
+        ("genres", string_list),
+        ("followers", pa.int64()),
+        ("popularity", pa.int32())
+    ])
+}
+
+
+def flatten_track(item):
+
+    """
+    Returns a row (dictionary) for a track, or for an item of a playlist (which contains the track)
+    :param item: a track, or a playlist item
+    """
+
+    track = item.get("track", item)
+    album = track.get("album", {})
+    artists = track.get("artists", [])
+
+    return {
+        "track_id": track.get("id"),
+        "track_name": track.get("name"),
+        "track_uri": track.get("uri"),
+        "duration_ms": track.get("duration_ms"),
+        "explicit": track.get("explicit"),
+        "popularity": track.get("popularity"),
+        "track_number": track.get("track_number"),
+        "disc_number": track.get("disc_number"),
+        "isrc": track.get("external_ids", {}).get("isrc"),
+        "album_id": album.get("id"),
+        "album_name": album.get("name"),
+        "album_type": album.get("album_type"),
+        "album_release_date": album.get("release_date"),
+        "artist_ids": [artist.get("id") for artist in artists],
+        "artist_names": [artist.get("name") for artist in artists],
+        "added_at": item.get("added_at")
+    }
+
+
+def flatten_album(album):
+
+    """
+    Returns a row (dictionary) for an album
+    :param album: an album
+    """
+
+    artists = album.get("artists", [])
+
+    return {
+        "album_id": album.get("id"),
+        "album_name": album.get("name"),
+        "album_uri": album.get("uri"),
+        "album_type": album.get("album_type"),
+        "release_date": album.get("release_date"),
+        "total_tracks": album.get("total_tracks"),
+        "artist_ids": [artist.get("id") for artist in artists],
+        "artist_names": [artist.get("name") for artist in artists]
+    }
+
+
+def flatten_artist(artist):
+
+    """
+    Returns a row (dictionary) for an artist
+    :param artist: an artist
+    """
+
+    return {
+        "artist_id": artist.get("id"),
+        "artist_name": artist.get("name"),
+        "artist_uri": artist.get("uri"),
+        "genres": artist.get("genres", []),
+        "followers": artist.get("followers", {}).get("total"),
+        "popularity": artist.get("popularity")
+    }
+
+
+flatteners = {"tracks": flatten_track, "albums": flatten_album, "artists": flatten_artist}
+
+
+class ParquetExporter:
+
+    """
+    Writes pages of results to a Parquet file, buffering them into row groups of row_group_size rows.
+    Can be used as a context manager, so the file is closed once the export is done.
+    """
+
+    def __init__(self, path, kind="tracks", seen=None, row_group_size=65536):
+
+        """
+        path: the path of the Parquet file.
+        kind: the kind of results that are exported. Either "tracks", "albums" or "artists".
+        seen: the ids already exported (i.e an IdTable or a BloomSet, see compact_ids).
+        If given, items whose id was already exported are skipped, and exported ids are added to it.
+        row_group_size: the number of rows of each row group (the last one may be smaller).
+        batches: the record batches buffered for the next row group.
+        rows_written: the number of rows exported so far (buffered rows included).
+        """
+
+        if kind not in schemas:
+            raise ValueError(f"'{kind}' is not a valid kind. Use either 'tracks', 'albums' or 'artists'")
+
+        self.path = path
+        self.kind = kind
+        self.schema = schemas[kind]
+        self.flatten = flatteners[kind]
+        self.seen = seen
+        self.row_group_size = row_group_size
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.batches = []
+        self.buffered_rows = 0
+        self.rows_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_record_batch(self, items):
+
+        """
+        Returns an Arrow record batch containing the flattened items
+        Local files and removed tracks (with no track object) are skipped
+        :param items: a list of tracks (or playlist items), albums or artists
+        """
+
+        rows = [self.flatten(item) for item in items if item and item.get("track", item)]
+
+        if self.seen is not None:
+            # the first column of every schema is the id
+            rows = [row for row in rows if self.is_new(row[self.schema.names[0]])]
+        columns = {name: [row[name] for row in rows] for name in self.schema.names}
+
+        return pa.RecordBatch.from_pydict(columns, schema=self.schema)
+
+    def is_new(self, item_id):
+
+        """
+        Returns whether an item hasn't been exported yet, and marks it as exported
+        Items without an id (i.e local files) are always exported
+        :param item_id: the id of the item
+        """
+
+        if item_id is None:
+            return True
+        if item_id in self.seen:
+            return False
+
+        self.seen.add(item_id)
+        return True
+
+    def write_page(self, page):
+
+        """
+        Writes the items of a page of results to the Parquet file
+        :param page: a page of results (a dictionary with "items")
+        """
+
+        batch = self.get_record_batch(page.get("items", []))
+
+        if batch.num_rows > 0:
+            self.batches.append(batch)
+            self.buffered_rows += batch.num_rows
+            self.rows_written += batch.num_rows
+
+        if self.buffered_rows >= self.row_group_size:
+            self.flush(full_row_groups_only=True)
+
+    def flush(self, full_row_groups_only=False):
+
+        """
+        Writes the buffered batches to the Parquet file, in row groups of row_group_size rows
+        :param full_row_groups_only: whether the rows that don't fill a whole row group are kept buffered
+        (so pages don't leave small row groups behind), rather than written as a smaller row group.
+        """
+
+        if not self.batches:
+            return
+
+        table = pa.Table.from_batches(self.batches, schema=self.schema)
+        rows = table.num_rows - table.num_rows % self.row_group_size if full_row_groups_only else table.num_rows
+
+        if rows > 0:
+            self.writer.write_table(table.slice(0, rows), row_group_size=self.row_group_size)
+
+        self.batches = table.slice(rows).to_batches()
+        self.buffered_rows = table.num_rows - rows
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def export_pages(pages, path, kind="tracks", seen=None, row_group_size=65536):
+
+    """
+    Writes pages of results to a Parquet file. Returns the number of rows written.
+    :param pages: an iterable of pages (i.e SptfySearchClient.get_pages or SptfyPlaylistClient.get_playlist_track_pages)
+    :param path: the path of the Parquet file
+    :param kind: the kind of results. Either "tracks", "albums" or "artists".
+    :param seen: the ids already exported (see ParquetExporter). Optional.
+    :param row_group_size: the number of rows of each row group (see ParquetExporter).
+    """
+
+    with ParquetExporter(path, kind=kind, seen=seen, row_group_size=row_group_size) as exporter:
+        for page in pages:
+            exporter.write_page(page)
+
+    return exporter.rows_written
+
+
+def export_playlist_tracks(playlist_client, playlist_id, path, market=None):
+
+    """
+    Writes every track of a playlist to a Parquet file. Returns the number of rows written.
+    :param playlist_client: a SptfyPlaylistClient
+    :param playlist_id: the id of the playlist
+    :param path: the path of the Parquet file
+    :param market: an ISO 3166-1 alpha-2 country code, for the market of interest.
+    """
+
+    pages = playlist_client.get_playlist_track_pages(playlist_id, market=market)
+
+    return export_pages(pages, path, kind="tracks")
+
+
+def export_search(search_client, path, search_parameters, content_type="track", operator=None, operator_query=None):
+
+    """
+    Writes every result of a search to a Parquet file. Returns the number of rows written.
+    :param search_client: a SptfySearchClient
+    :param path: the path of the Parquet file
+    :param search_parameters: the search parameters (see SptfySearchClient.search)
+    :param content_type: either "track", "album" or "artist"
+    :param operator: the operator to use (see SptfySearchClient.search)
+    :param operator_query: the object to which we apply the operator (see SptfySearchClient.search)
+    """
+
+    kind = f"{content_type}s"
+    results = search_client.search(search_parameters=search_parameters, operator=operator,
+                                   operator_query=operator_query, content_type=content_type, limit=50)
+
+    return export_pages(search_client.get_pages(results, key=kind), path, kind=kind)
+
+
+def export_new_releases(browse_client, path, country=None):
+
+    """
+    Writes every new release to a Parquet file. Returns the number of rows written.
+    :param browse_client: a SptfyBrowseClient
+    :param path: the path of the Parquet file
+    :param country: A country, shown as n ISO 3166-1 alpha-2 country code.
+    """
+
+    new_releases = browse_client.get_new_releases(country=country, limit=50)
+    pages = browse_client.get_search_client().get_pages(new_releases, key="albums")
+
+    return export_pages(pages, path, kind="albums")
+
+
+def read_parquet(path, columns=None):
+
+    """
+    Reads a Parquet file written by this module, using memory mapping, and returns an Arrow table
+    :param path: the path of the Parquet file
+    :param columns: the columns to read. If None, every column is read.
+    """
+
+    return pq.read_table(path, columns=columns, memory_map=True)
@@ -0,0 +1,181 @@
+from concurrent.futures import ThreadPoolExecutor  # used to expand several seeds at once
+
+from track_index import normalize  # used to find the same song released more than once
+from spotify_deadline import propagate  # used to carry the caller's current_deadline into the request threads
+
+# Generates a playlist from seed artists, tracks and genres:
+# 1. the seed artists are expanded with their related artists (all at once).
+# 2. recommendations are requested for groups of up to 5 seeds (the most Spotify allows per request), all at once.
+# 3. the recommended tracks are scored locally: a track recommended from many seeds scores higher,
+#    and popularity breaks ties. The same song (by name & artist) is only kept once, and each artist appears a limited
+#    number of times, so the playlist isn't dominated by a single artist.
+# 4. the best tracks are written to a new playlist, 100 at a time.
+
+
+def get_seed_groups(seeds, size=5):
+
+    """
+    Splits (kind, value) seeds into groups of at most 5, as taken by a single recommendations request
+    Returns a list of dictionaries of arguments for get_recommendations
+    i.e [{"seed_artists": [...], "seed_tracks": [...], "seed_genres": [...]}]
+    :param seeds: a list of ("artist", id), ("track", id) or ("genre", name) tuples
+    :param size: the number of seeds per group
+    """
+
+    groups = []
+
+    for i in range(0, len(seeds), size):
+        group = {"seed_artists": [], "seed_tracks": [], "seed_genres": []}
+        for kind, value in seeds[i:i + size]:
+            group[f"seed_{kind}s"].append(value)
+        groups.append(group)
+
+    return groups
+
+
+def expand_artists(search_client, artist_ids, related_per_artist=5, max_workers=8):
+
+    """
+    Returns the seed artists followed by their most related artists, without duplicates
+    :param search_client: the SptfySearchClient used to request the related artists
+    :param artist_ids: the ids of the seed artists
+    :param related_per_artist: the number of related artists kept for each seed artist
+    :param max_workers: the maximum number of requests sent at once
+    """
+
+    if related_per_artist == 0 or not artist_ids:
+        return list(artist_ids)
+
+    def get_related(artist_id):
+        related = search_client.get_resource(artist_id, resource_type="artist", keyword="related-artists")
+        return [artist["id"] for artist in related.get("artists", [])[:related_per_artist]]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        related_ids = list(executor.map(propagate(get_related), artist_ids))
+
+    return list(dict.fromkeys(list(artist_ids) + [artist_id for ids in related_ids for artist_id in ids]))
+
+
+def get_candidates(search_client, seed_artists=(), seed_tracks=(), seed_genres=(), related_per_artist=5,
+                   recommendations_per_group=100, market=None, max_workers=8, **tunables):
+
+    """
+    Expands the seeds, and returns every recommended track (by id), with the number of seed groups that recommended it
+    i.e {track_id: {"track": {...}, "count": 3}}
+    :param search_client: the SptfySearchClient used to make the requests
+    :param seed_artists: a list of artist ids
+    :param seed_tracks: a list of track ids
+    :param seed_genres: a list of genres (i.e "hip-hop")
+    :param related_per_artist: the number of related artists added as seeds for each seed artist
+    :param recommendations_per_group: the number of tracks recommended for each group of 5 seeds. Maximum: 100.
+    :param market: an ISO 3166-1 alpha-2 country code
+    :param max_workers: the maximum number of requests sent at once
+    :param tunables: target, minimum or maximum track attributes (see SptfySearchClient.get_recommendations)
+    """
+
+    search_client.get_access_token()  # shared by the related-artist & recommendation requests below
+
+    artist_ids = expand_artists(search_client, list(seed_artists), related_per_artist=related_per_artist,
+                                max_workers=max_workers)
+
+    seeds = ([("artist", artist_id) for artist_id in artist_ids] + [("track", track_id) for track_id in seed_tracks] +
+             [("genre", genre) for genre in seed_genres])
+
+    if not seeds:
+        raise ValueError("You need to provide at least one seed artist, track or genre")
+
+    def recommend(group):
+        return search_client.get_recommendations(limit=recommendations_per_group, market=market, **group, **tunables)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        recommendations = list(executor.map(propagate(recommend), get_seed_groups(seeds)))
+
+    candidates = {}
+
+    for tracks in recommendations:
+        for track in tracks:
+            candidate = candidates.setdefault(track["id"], {"track": track, "count": 0})
+            candidate["count"] += 1
+
+    return candidates
+
+
+def score_candidates(candidates, size=50, max_per_artist=3, exclude=()):
+
+    """
+    Returns the URIs of the best candidates, best first
+    Candidates recommended from more seed groups score higher; popularity breaks ties.
+    The same song (same name & first artist) is only kept once, and each artist is kept at most max_per_artist times.
+    :param candidates: the candidates returned by get_candidates
+    :param size: the number of tracks returned
+    :param max_per_artist: the maximum number of tracks by the same (first) artist
+    :param exclude: track ids left out (i.e the seed tracks)
+    """
+
+    ranked = sorted(candidates.values(), key=lambda candidate: (candidate["count"],
+                                                                candidate["track"].get("popularity", 0)), reverse=True)
+
+    songs = set()
+    artist_counts = {}
+    uris = []
+
+    for candidate in ranked:
+        track = candidate["track"]
+        artist = track["artists"][0]["id"] if track.get("artists") else None
+        song = (normalize(track["name"]), artist)
+
+        if track["id"] in exclude or song in songs or artist_counts.get(artist, 0) >= max_per_artist:
+            continue
+
+        songs.add(song)
+        artist_counts[artist] = artist_counts.get(artist, 0) + 1
+        uris.append(track["uri"])
+
+        if len(uris) == size:
+            break
+
+    return uris
+
+
+def generate_playlist(search_client, playlist_client, user_id, password, playlist_name, seed_artists=(),
+                      seed_tracks=(), seed_genres=(), size=50, max_per_artist=3, related_per_artist=5, market=None,
+                      public="false", description="A generated playlist", walkthrough_mode=False, max_workers=8,
+                      **tunables):
+
+    """
+    Generates a playlist from seed artists, tracks and genres, and returns its id
+    :param search_client: the SptfySearchClient used to request related artists & recommendations
+    :param playlist_client: the SptfyPlaylistClient used to create the playlist
+    :param user_id: the username of the Spotify Account in which the playlist is to be created.
+    :param password: the password of the Spotify Account in which the playlist is to be created.
+    :param playlist_name: the name of the playlist
+    :param seed_artists: a list of artist ids
+    :param seed_tracks: a list of track ids
+    :param seed_genres: a list of genres (i.e "hip-hop")
+    :param size: the number of tracks in the playlist
+    :param max_per_artist: the maximum number of tracks by the same artist
+    :param related_per_artist: the number of related artists added as seeds for each seed artist
+    :param market: an ISO 3166-1 alpha-2 country code
+    :param public: a boolean String used to determine whether the playlist ought to be public or private.
+    :param description: the description for the playlist
+    :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
+    :param max_workers: the maximum number of requests sent at once
+    :param tunables: target, minimum or maximum track attributes (i.e target_energy = 0.8)
+    """
+
+    candidates = get_candidates(search_client, seed_artists=seed_artists, seed_tracks=seed_tracks,
+                                seed_genres=seed_genres, related_per_artist=related_per_artist, market=market,
+                                max_workers=max_workers, **tunables)
+
+    uris = score_candidates(candidates, size=size, max_per_artist=max_per_artist, exclude=set(seed_tracks))
+
+    print(f"{len(candidates)} tracks recommended. Keeping the best {len(uris)}")
+
+    playlist_id = playlist_client.create_playlist(user_id, password, walkthrough_mode=walkthrough_mode,
+                                                  playlist_name=playlist_name, public=public,
+                                                  description=description)
+
+    if uris:
+        playlist_client.add_uris_to_playlist(user_id, password, playlist_id, uris, walkthrough_mode=walkthrough_mode)
+
+    return playlist_id
@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor  # used to read several playlists at once
+
+from compact_ids import IdTable  # used to hold the tracks of each playlist as 128-bit integers, in order
+from spotify_deadline import propagate  # used so the threads reading the playlists see the caller's current_deadline
+
+# Union, intersection and difference of playlists:
+# 1. the source playlists are read at once, page by page, with only the URIs of their tracks ("uris_only").
+# 2. the tracks of each playlist are held in an IdTable (16 bytes per track, in the order they were added),
+#    instead of lists of track objects.
+# 3. the result is streamed from those tables, keeping the order of the playlists & of their tracks:
+#    - union: the tracks of the first playlist, then the new tracks of the second one, and so on.
+#    - intersection: the tracks of the first playlist found in every other one.
+#    - difference: the tracks of the first playlist found in none of the other ones.
+# Each track appears once in the result. Local files & episodes (which have no track id) are left out.
+
+
+def get_track_table(playlist_client, playlist_id, token=None):
+
+    """
+    Reads the tracks of a playlist, and returns their ids as an IdTable, in the order they appear in the playlist
+    Raises an Exception if a page of the playlist can't be read (i.e a private playlist read without a user token)
+    :param playlist_client: the SptfyPlaylistClient used to read the playlist
+    :param playlist_id: the id of the playlist
+    :param token: a user token (see SptfyPlaylistClient.get_token), required to read private playlists. Optional.
+    """
+
+    table = IdTable()
+
+    for page in playlist_client.get_playlist_track_pages(playlist_id, projection="uris_only", token=token):
+        for uri in playlist_client.check_playlist_response(page, playlist_id)["uris"]:
+            if uri.startswith("spotify:track:"):
+                table.add(uri[len("spotify:track:"):])
+
+    return table
+
+
+def union(tables):
+
+    """
+    Yields the ids of the tables, in order: the ids of the first table, then the new ids of the second one, and so on
+    :param tables: a list of IdTables
+    """
+
+    seen = IdTable()
+    for table in tables:
+        for spotify_id in table:
+            if spotify_id not in seen:
+                seen.add(spotify_id)
+                yield spotify_id
+
+
+def intersection(tables):
+
+    """
+    Yields the ids of the first table found in every other table, in the order of the first table
+    :param tables: a list of IdTables
+    """
+
+    first, others = tables[0], sorted(tables[1:], key=len)  # the smallest tables rule out the most tracks
+    for spotify_id in first:
+        if all(spotify_id in table for table in others):
+            yield spotify_id
+
+
+def difference(tables):
+
+    """
+    Yields the ids of the first table found in none of the other tables, in the order of the first table
+    :param tables: a list of IdTables
+    """
+
+    first, others = tables[0], tables[1:]
+    for spotify_id in first:
+        if not any(spotify_id in table for table in others):
+            yield spotify_id
+
+
+operations = {"union": union, "intersection": intersection, "difference": difference}
+
+
+def combine_playlists(playlist_client, playlist_ids, operation="union", token=None, max_workers=8):
+
+    """
+    Reads several playlists at once, and yields the URIs of the tracks resulting from a set operation over them
+    :param playlist_client: the SptfyPlaylistClient used to read the playlists
+    :param playlist_ids: the ids of the playlists. For intersection & difference, the first one is the one
+    the others are compared to (and whose order is kept).
+    :param operation: either "union", "intersection" or "difference"
+    :param token: a user token (see SptfyPlaylistClient.get_token), required to read private playlists. Optional.
+    :param max_workers: the maximum number of playlists read at once
+    """
+
+    if operation not in operations:
+        raise ValueError(f"operation must be one of {', '.join(operations)} (not '{operation}')")
+
+    if not playlist_ids:
+        raise ValueError("You need to provide at least one playlist")
+
+    if token is None:
+        playlist_client.get_access_token()  # without a user token, every playlist is read with the client's token
+
+    def read(playlist_id):
+        return get_track_table(playlist_client, playlist_id, token=token)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tables = list(executor.map(propagate(read), playlist_ids))
+
+    print(f"Read {sum(len(table) for table in tables)} tracks from {len(tables)} playlists")
+
+    for spotify_id in operations[operation](tables):
+        yield f"spotify:track:{spotify_id}"
+
+
+def create_combined_playlist(playlist_client, user_id, password, playlist_ids, playlist_name, operation="union",
+                             public="false", description=None, walkthrough_mode=False, max_workers=8):
+
+    """
+    Writes the result of a set operation over several playlists to a new playlist, and returns its id
+    The source playlists are read with the user's token, so private playlists can be combined.
+    :param playlist_client: the SptfyPlaylistClient used to read & create the playlists
+    :param user_id: the username of the Spotify Account in which the playlist is to be created.
+    :param password: the password of the Spotify Account in which the playlist is to be created.
+    :param playlist_ids: the ids of the source playlists (see combine_playlists)
+    :param playlist_name: the name of the new playlist
+    :param operation: either "union", "intersection" or "difference"
+    :param public: a boolean String used to determine whether the playlist ought to be public or private.
+    :param description: the description for the playlist. If None, the operation & number of playlists are used.
+    :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
+    :param max_workers: the maximum number of playlists read at once
+    """
+
+    token = playlist_client.get_token(user_id=user_id, password=password, walkthrough_mode=walkthrough_mode)
+
+    uris = list(combine_playlists(playlist_client, playlist_ids, operation=operation, token=token,
+                                  max_workers=max_workers))
+
+    if description is None:
+        description = f"The {operation} of {len(playlist_ids)} playlists"
+
+    playlist_id = playlist_client.create_playlist(user_id, password, walkthrough_mode=walkthrough_mode,
+                                                  playlist_name=playlist_name, public=public,
+                                                  description=description)
+
+    if uris:
+        playlist_client.add_uris_to_playlist(user_id, password, playlist_id, uris, walkthrough_mode=walkthrough_mode)
+
+    return playlist_id
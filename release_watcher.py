@@ -0,0 +1,238 @@
+import threading  # used to run the watcher in the background, and to stop it
+
+from compact_ids import IdTable  # used to store the ids of the items seen so far compactly
+
+
+class NewReleasesWatcher:
+
+    """
+    Polls the new releases (and, optionally, the playlists of some categories) of several markets,
+    and emits only the items that haven't been seen before, to a callback and/or a queue.
+    Requests are conditional (using ETags), so unchanged results aren't downloaded again,
+    and the polling interval adapts to how often new items appear.
+    """
+
+    def __init__(self, browse_client, markets, callback=None, queue=None, category_ids=(), min_interval=60,
+                 max_interval=3600, limit=50, emit_initial=False, seen=None):
+
+        """
+        browse_client: the SptfyBrowseClient used to make the requests.
+        markets: a list of ISO 3166-1 alpha-2 country codes.
+        callback: a function called with each new item. Optional.
+        queue: a queue (i.e queue.Queue) to which each new item is put. Optional.
+        category_ids: the ids of the categories whose playlists are watched (i.e ["toplists", "pop"]).
+        min_interval: the minimum number of seconds between polls.
+        max_interval: the maximum number of seconds between polls.
+        limit: the number of releases (and playlists) requested for each market. Maximum: 50.
+        emit_initial: whether the items found by the first successful read of each result are emitted.
+        If False, they are only marked as seen (a market whose first poll failed doesn't flood the callback later).
+        seen: the ids of the albums & playlists seen so far. An IdTable by default (see compact_ids);
+        a BloomSet can be used instead, to keep memory fixed.
+        interval: the current number of seconds between polls.
+        errors: the number of requests of the last poll that failed (errors, timeouts & error responses).
+        retry_after: the number of seconds Spotify asked to wait before the next request (after a 429 response).
+        etags: the ETag of the last response for each URL.
+        initialised: the URLs that have been read successfully at least once.
+        """
+
+        self.browse_client = browse_client
+        self.markets = markets
+        self.callback = callback
+        self.queue = queue
+        self.category_ids = category_ids
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.limit = limit
+        self.emit_initial = emit_initial
+
+        self.interval = min_interval
+        self.polls = 0
+        self.errors = 0
+        self.retry_after = 0
+        self.etags = {}
+        self.initialised = set()
+        self.seen = seen if seen is not None else IdTable()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def get_watched_urls(self):
+
+        """
+        Returns a list of (item type, market, category id, URL) tuples, for every result that is watched
+        """
+
+        b = self.browse_client
+        urls = []
+
+        for market in self.markets:
+            releases_url = b.get_request_url(base_url=b.releases_url, category_query="get_releases", country=market,
+                                             limit=self.limit)
+            urls.append(("album", market, None, releases_url))
+
+            for category_id in self.category_ids:
+                playlists_url = b.get_request_url(base_url=f"{b.categories_url}/{category_id}/playlists",
+                                                  category_query="get_category_playlist", country=market,
+                                                  limit=self.limit)
+                urls.append(("playlist", market, category_id, playlists_url))
+
+        return urls
+
+    def emit(self, item):
+
+        """
+        Sends a new item to the callback and/or the queue
+        :param item: a dictionary with the item's type ("album" or "playlist"), market, category id & the item itself
+        """
+
+        if self.callback is not None:
+            self.callback(item)
+        if self.queue is not None:
+            self.queue.put(item)
+
+    def poll(self):
+
+        """
+        Requests every watched result (skipping those that haven't changed), and emits the items that weren't seen before
+        A failed request (i.e a connection error, a timeout, or an error response) is logged & counted in errors,
+        and the other results are still polled. After a 429 response, the rest of the poll is skipped.
+        An item is only marked as seen once it has been emitted: if the callback (or the queue) fails, the failure is
+        logged, the rest of the result is still emitted, and the result is read in full (and the item emitted) again
+        by the next poll.
+        Returns the number of new items
+        """
+
+        new_items = 0
+        self.errors = 0
+        self.retry_after = 0
+
+        for item_type, market, category_id, url in self.get_watched_urls():
+            try:
+                r = self.browse_client.get_conditional_response(url, self.etags.get(url))
+
+                if r.status_code == 429:
+                    self.errors += 1
+                    self.retry_after = float(r.headers.get("Retry-After", self.interval))
+                    print(f"Rate limited whilst polling {market}. Retrying in {self.retry_after:.0f} seconds")
+                    break
+                if r.status_code == 304:
+                    continue
+                if r.status_code != 200:
+                    raise Exception(f"Status Code: {r.status_code}")
+
+                items = r.json().get(f"{item_type}s", {}).get("items", [])
+                emitted, complete = self.emit_items(items, item_type, market, category_id,
+                                                    emit=url in self.initialised or self.emit_initial)
+            except Exception as e:
+                self.errors += 1
+                print(f"Could not poll {item_type}s of {market}{f' ({category_id})' if category_id else ''}: "
+                      f"{type(e).__name__}: {e}")
+                continue
+
+            new_items += emitted
+
+            # the ETag is only kept once every item has been emitted, so a result whose items couldn't all be emitted
+            # is requested in full next time
+            if complete:
+                self.etags[url] = r.headers.get("ETag")
+                self.initialised.add(url)
+
+        self.polls += 1
+
+        return new_items
+
+    def emit_items(self, items, item_type, market, category_id, emit=True):
+
+        """
+        Emits the items of a result that weren't seen before, marking each one as seen once it has been emitted
+        Returns the number of new items, and whether every one of them was emitted (the callback or the queue
+        may fail for some of them)
+        :param items: the items of the result (albums or playlists)
+        :param item_type: either "album" or "playlist"
+        :param market: the market of the result
+        :param category_id: the category of the result (for playlists)
+        :param emit: whether the new items are emitted. If False, they are only marked as seen.
+        """
+
+        new_items = 0
+        failed = False
+
+        for item in items:
+            if item is None or item["id"] in self.seen:
+                continue
+
+            if emit:
+                try:
+                    self.emit({"type": item_type, "market": market, "category_id": category_id, "item": item})
+                except Exception as e:
+                    failed = True
+                    print(f"Could not emit {item_type} {item['id']}: {type(e).__name__}: {e}")
+                    continue
+
+            self.seen.add(item["id"])
+            new_items += 1
+
+        return new_items, not failed
+
+    def adapt_interval(self, new_items):
+
+        """
+        Polls more often when new items appear, and less often when nothing changes.
+        After failed requests, the interval doubles (up to max_interval), and a 429's Retry-After is always waited for.
+        :param new_items: the number of new items found by the last poll
+        """
+
+        if self.errors > 0:
+            self.interval = max(self.retry_after, min(self.max_interval, self.interval * 2))
+        elif new_items > 0:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+
+    def run(self, max_polls=None):
+
+        """
+        Polls until stop is called (or max_polls polls have been made)
+        Failures are logged, and never stop the polling.
+        :param max_polls: the maximum number of polls. If None, polls until stopped.
+        """
+
+        while not self.stop_event.is_set():
+            try:
+                new_items = self.poll()
+            except Exception as e:
+                # i.e the token couldn't be requested
+                self.polls += 1
+                self.errors += 1
+                new_items = 0
+                print(f"Poll {self.polls} failed: {type(e).__name__}: {e}")
+
+            if self.polls > 1 or self.errors > 0:
+                self.adapt_interval(new_items)
+
+            print(f"Poll {self.polls}: {new_items} new item(s). Next poll in {self.interval:.0f} seconds")
+
+            if max_polls is not None and self.polls >= max_polls:
+                break
+
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+
+        """
+        Starts polling in a background thread
+        """
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+
+        """
+        Stops polling, waiting for the current poll to finish
+        """
+
+        self.stop_event.set()
+
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,235 @@
+import os  # used to replace hot set files atomically
+import json  # used to save & load hot sets
+import time  # used to expire cached resources
+import atexit  # used to save the hot set when the process exits
+import threading  # used to warm the cache in the background, and so threads can share the cache
+
+from collections import Counter, OrderedDict  # used to count accesses & keep the most recently used resources
+from urllib.parse import urlparse, urlencode, parse_qs  # used to turn single resource URLs into batched requests
+
+# Resources (artists, albums, tracks, ...) are cached by URL, so repeated requests don't reach the Spotify Web API.
+# They are stored as JSON strings, and every hit returns a new copy, so a caller changing a result
+# (i.e get_discography filling in the tracks of an album) can't change what later hits return.
+# The cache counts how often each URL is accessed, and saves the most accessed ones (the "hot set") when the process exits.
+# The next process can then warm its cache from the hot set in the background, instead of starting cold.
+
+# endpoints which return several resources at once (i.e /artists?ids=...), and the number of ids each request takes
+batch_endpoints = {"artists": 50, "albums": 20, "tracks": 50}
+
+
+class ResourceCache:
+
+    """
+    A least recently used cache of API responses (by URL), which counts how often each URL is accessed.
+    """
+
+    def __init__(self, max_size=10000, ttl=3600, hot_set_path=None, hot_set_size=1000, max_tracked=100000):
+
+        """
+        max_size: the maximum number of responses cached. The least recently used ones are dropped first.
+        ttl: the number of seconds a response is cached for.
+        hot_set_path: the file to which the hot set is saved when the process exits. If None, it isn't saved.
+        hot_set_size: the number of URLs in the hot set.
+        max_tracked: the maximum number of URLs whose accesses are counted. Once it is reached, the counts decay
+        (see decay_accesses), so the counter doesn't grow with every URL ever requested.
+        resources: the cached responses, as JSON strings (and the time they expire), by URL.
+        accesses: the number of times each URL has been accessed (recently).
+        """
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hot_set_path = hot_set_path
+        self.hot_set_size = hot_set_size
+        self.max_tracked = max_tracked
+
+        self.resources = OrderedDict()
+        self.accesses = Counter()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if hot_set_path is not None:
+            atexit.register(self.save_hot_set, hot_set_path)
+
+    def get(self, url):
+
+        """
+        Returns the cached response for a URL, or None if it isn't cached (or has expired)
+        Every call counts as an access to the URL.
+        :param url: the URL of the request
+        """
+
+        with self.lock:
+            self.accesses[url] += 1
+            if len(self.accesses) > self.max_tracked:
+                self.decay_accesses()
+
+            cached = self.resources.get(url)
+
+            if cached is None or cached[0] < time.time():
+                self.misses += 1
+                return None
+
+            self.resources.move_to_end(url)
+            self.hits += 1
+
+        return json.loads(cached[1])
+
+    def decay_accesses(self):
+
+        """
+        Keeps the counts of the most accessed half of the URLs, halved (so URLs which stopped being accessed
+        eventually make way for new ones), and forgets the others. Called with the lock held.
+        """
+
+        most_accessed = self.accesses.most_common(self.max_tracked // 2)
+        self.accesses = Counter({url: (count + 1) // 2 for url, count in most_accessed})
+
+    def put(self, url, resource):
+
+        """
+        Caches the response for a URL
+        :param url: the URL of the request
+        :param resource: the JSON of the response
+        """
+
+        # stored as a JSON string, so changes the caller later makes to the resource aren't cached
+        data = json.dumps(resource)
+
+        with self.lock:
+            self.resources[url] = (time.time() + self.ttl, data)
+            self.resources.move_to_end(url)
+
+            if len(self.resources) > self.max_size:
+                self.resources.popitem(last=False)
+
+    def get_hot_set(self, size=None):
+
+        """
+        Returns the most accessed URLs, the most accessed first
+        :param size: the number of URLs. If None, hot_set_size is used.
+        """
+
+        with self.lock:
+            return [url for url, _ in self.accesses.most_common(size or self.hot_set_size)]
+
+    def save_hot_set(self, path):
+
+        """
+        Writes the hot set to a JSON file, so the next process can warm its cache with it
+        :param path: the path of the file
+        """
+
+        temporary_path = f"{path}.tmp"
+
+        with open(temporary_path, "w") as f:
+            json.dump(self.get_hot_set(), f)
+
+        os.replace(temporary_path, path)
+
+    def get_stats(self):
+        with self.lock:
+            return {"size": len(self.resources), "hits": self.hits, "misses": self.misses}
+
+
+def get_batches(urls, base_url):
+
+    """
+    Groups the URLs of single artists, albums & tracks (i.e .../v1/artists/<id>) into batched requests
+    Returns a list of (batched URL, {id: single resource URL}) tuples, and the list of URLs that can't be batched
+    :param urls: the URLs to request
+    :param base_url: the base URL of the API (i.e "https://api.spotify.com/v1")
+    """
+
+    groups = {}
+    others = []
+
+    for url in urls:
+        parsed = urlparse(url)
+        segments = parsed.path[len(urlparse(base_url).path):].strip("/").split("/")
+
+        if url.startswith(base_url) and len(segments) == 2 and segments[0] in batch_endpoints:
+            groups.setdefault((segments[0], parsed.query), {})[segments[1]] = url
+        else:
+            others.append(url)
+
+    batches = []
+
+    for (endpoint, query), ids in groups.items():
+        ids = list(ids.items())
+        size = batch_endpoints[endpoint]
+
+        for i in range(0, len(ids), size):
+            batch = dict(ids[i:i + size])
+            batch_query = {key: values[0] for key, values in parse_qs(query).items()}
+            batch_query["ids"] = ",".join(batch)
+            batches.append((f"{base_url}/{endpoint}?{urlencode(batch_query)}", batch))
+
+    return batches, others
+
+
+def warm_cache(search_client, path, budget=50, background=True):
+
+    """
+    Fills the cache of a Search Client with the hot set saved by a previous process
+    Single artists, albums & tracks are requested in batches (i.e 50 artists per request).
+    The token is requested first, so the first requests of the process don't wait for it.
+    Returns the thread warming the cache (or None if background is False).
+    :param search_client: a SptfySearchClient with a resource_cache.
+    :param path: the path of the saved hot set.
+    :param budget: the maximum number of requests made to warm the cache.
+    :param background: whether to warm the cache in a background thread.
+    """
+
+    cache = search_client.resource_cache
+
+    if cache is None:
+        raise ValueError("The Search Client has no resource cache to warm")
+
+    def warm():
+        if not os.path.exists(path):
+            print(f"No hot set found at {path}. Starting with an empty cache")
+            return
+
+        with open(path) as f:
+            hot_set = json.load(f)
+
+        search_client.get_access_token()
+
+        batches, others = get_batches(hot_set, search_client.base_url)
+        requests_made = 0
+        warmed = 0
+
+        for batch_url, batch in batches:
+            if requests_made >= budget:
+                break
+
+            r = search_client.get_response(batch_url)
+            requests_made += 1
+
+            if r.status_code != 200:
+                continue
+
+            for resources in r.json().values():
+                for resource in resources:
+                    if resource is not None and resource.get("id") in batch:
+                        cache.put(batch[resource["id"]], search_client.index_json(resource))
+                        warmed += 1
+
+        for url in others[:max(0, budget - requests_made)]:
+            r = search_client.get_response(url)
+
+            if r.status_code == 200:
+                cache.put(url, search_client.index_json(r.json()))
+                warmed += 1
+
+        print(f"Warmed the cache with {warmed} resources of {len(hot_set)}")
+
+    if not background:
+        warm()
+        return None
+
+    thread = threading.Thread(target=warm, daemon=True)
+    thread.start()
+
+    return thread
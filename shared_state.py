@@ -0,0 +1,249 @@
+import time  # used to refill rate-limit budgets & wait for them
+import sqlite3  # used as a store shared by several processes
+import datetime  # used to store the expiration time of tokens
+import threading  # used so that threads of a process don't use the same connection at once
+
+from spotify_deadline import check_deadline, get_deadline, DeadlineExceeded  # used to stop waiting past the deadline
+
+# State shared by several processes (i.e the shards of a batch run), stored in a local SQLite database.
+# Writes happen within short "BEGIN IMMEDIATE" transactions, which lock the database,
+# so only one process at a time can claim a token refresh or take from a rate-limit budget.
+# The database is never locked whilst a request is being made.
+
+
+def connect(db_path):
+
+    """
+    Returns a connection to the shared database, creating its tables if needed
+    Connections aren't shared between processes: each process opens its own.
+    :param db_path: the path of the SQLite database
+    """
+
+    connection = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS tokens "
+                       "(key TEXT PRIMARY KEY, token TEXT, expires_at REAL, refreshing_until REAL)")
+    connection.execute("CREATE TABLE IF NOT EXISTS budgets "
+                       "(name TEXT PRIMARY KEY, tokens REAL, updated_at REAL, paused_until REAL)")
+
+    return connection
+
+
+class SharedTokenCache:
+
+    """
+    Tokens shared by several processes.
+    When a token is missing or expired, a single process requests a new one, whilst the others wait for it.
+    """
+
+    def __init__(self, db_path, margin=60, lease=30):
+
+        """
+        db_path: the path of the SQLite database.
+        margin: the number of seconds before its expiration time at which a token is no longer handed out.
+        lease: the number of seconds a process has to request a new token, before another process can try instead.
+        """
+
+        self.db_path = db_path
+        self.margin = margin
+        self.lease = lease
+        self.connection = connect(db_path)
+        self.lock = threading.Lock()
+
+    def claim_token(self, key):
+
+        """
+        Returns the stored (token, expiration_time) tuple for a key if it is still valid.
+        Otherwise, returns "refresh" if this process must request a new token (it holds the lease),
+        or "wait" if another process is already requesting it.
+        :param key: identifies the token (i.e a client id)
+        """
+
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+
+            try:
+                row = self.connection.execute("SELECT token, expires_at, refreshing_until FROM tokens WHERE key = ?",
+                                              (key,)).fetchone()
+                now = time.time()
+
+                if row is not None and row[0] is not None and row[1] - self.margin > now:
+                    claim = (row[0], datetime.datetime.fromtimestamp(row[1]))
+                elif row is not None and row[2] > now:
+                    claim = "wait"
+                else:
+                    self.connection.execute("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?)",
+                                            (key, row[0] if row else None, row[1] if row else 0, now + self.lease))
+                    claim = "refresh"
+
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+        return claim
+
+    def get_token(self, key, request_token):
+
+        """
+        Returns a (token, expiration_time) tuple for a key, requesting a new token if the stored one has expired
+        Only one process requests a new token, whilst the others wait for it (until the deadline, if there is one)
+        :param key: identifies the token (i.e a client id)
+        :param request_token: a function requesting a new token, which returns a (token, expiration_time) tuple
+        """
+
+        while True:
+            claim = self.claim_token(key)
+
+            if claim == "wait":
+                check_deadline()
+                time.sleep(0.1)
+            elif claim == "refresh":
+                break
+            else:
+                return claim
+
+        try:
+            token, expiration_time = request_token()
+        except BaseException:
+            # release the lease, so another process can try
+            with self.lock:
+                self.connection.execute("UPDATE tokens SET refreshing_until = 0 WHERE key = ?", (key,))
+            raise
+
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, 0)",
+                                    (key, token, expiration_time.timestamp()))
+
+        return token, expiration_time
+
+
+class SharedRateLimiter:
+
+    """
+    A request budget (token bucket) shared by several processes, so their combined requests stay within a rate limit.
+    A 429 response received by any process pauses every process for its "Retry-After" time.
+    """
+
+    def __init__(self, db_path, rate=10, burst=20, name="api"):
+
+        """
+        db_path: the path of the SQLite database.
+        rate: the number of requests per second allowed across all processes.
+        burst: the maximum number of requests that can be made at once, after a period without requests.
+        name: identifies the budget, so several budgets can share a database.
+        """
+
+        self.db_path = db_path
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self.connection = connect(db_path)
+        self.lock = threading.Lock()
+
+        self.connection.execute("INSERT OR IGNORE INTO budgets VALUES (?, ?, ?, 0)", (name, burst, time.time()))
+
+    def acquire(self):
+
+        """
+        Takes a request from the budget, waiting until one is available
+        Raises DeadlineExceeded if the budget has no request available before the deadline (if there is one)
+        """
+
+        while True:
+            with self.lock:
+                self.connection.execute("BEGIN IMMEDIATE")
+
+                try:
+                    tokens, updated_at, paused_until = self.connection.execute(
+                        "SELECT tokens, updated_at, paused_until FROM budgets WHERE name = ?", (self.name,)).fetchone()
+
+                    now = time.time()
+                    tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+
+                    if now < paused_until:
+                        wait = paused_until - now
+                    elif tokens >= 1:
+                        tokens -= 1
+                        wait = 0
+                    else:
+                        wait = (1 - tokens) / self.rate
+
+                    self.connection.execute("UPDATE budgets SET tokens = ?, updated_at = ? WHERE name = ?",
+                                            (tokens, now, self.name))
+                    self.connection.execute("COMMIT")
+                except BaseException:
+                    self.connection.execute("ROLLBACK")
+                    raise
+
+            if wait == 0:
+                return
+
+            deadline = get_deadline()
+            if deadline is not None and deadline.get_remaining() < wait:
+                raise DeadlineExceeded(f"The shared rate limit has no request available before the deadline "
+                                       f"({wait:.1f} seconds)")
+            time.sleep(wait)
+
+    def pause(self, seconds):
+
+        """
+        Stops every process from making requests for a number of seconds (i.e after a 429 response)
+        :param seconds: the number of seconds to pause for
+        """
+
+        with self.lock:
+            self.connection.execute("UPDATE budgets SET paused_until = MAX(paused_until, ?), tokens = 0 WHERE name = ?",
+                                    (time.time() + seconds, self.name))
+
+
+class RateLimitedTransport:
+
+    """
+    Wraps a transport, so that every request takes from a SharedRateLimiter budget.
+    """
+
+    def __init__(self, transport, rate_limiter):
+
+        """
+        transport: the transport used to send the requests (see spotify_transport).
+        rate_limiter: the SharedRateLimiter shared by every process.
+        """
+
+        self.transport = transport
+        self.rate_limiter = rate_limiter
+
+    def request(self, method, url, **kwargs):
+
+        """
+        Waits for the shared budget, then makes the request, and returns the response
+        A 429 response pauses every process for its "Retry-After" time
+        Raises DeadlineExceeded if the budget has no request available before the deadline (if there is one),
+        or if the deadline passed whilst waiting. The wrapped transport bounds the request by the time left.
+        """
+
+        self.rate_limiter.acquire()
+        check_deadline()
+        r = self.transport.request(method, url, **kwargs)
+
+        if r.status_code == 429:
+            retry_after = float(r.headers.get("Retry-After", 1))
+            print(f"Rate limited. Pausing every process for {retry_after} seconds")
+            self.rate_limiter.pause(retry_after)
+
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.transport.close()
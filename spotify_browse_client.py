@@ -1,8 +1,10 @@
-import requests  # used to make requests
 import datetime  # used to determine expiration time of token
 
 from urllib.parse import urlencode  # used to parse URLs for queries in Spotify
-from spotify_search_client import SptfySearchClient  # used to search using the Spotify API
+from spotify_transport import RequestsTransport  # used to make requests
+from spotify_deadline import accepts_deadline  # used to bound how long operations take
+
+# spotify_search_client is imported when a token is first needed (see get_search_client)
 
 class SptfyBrowseClient:
 
@@ -10,11 +12,13 @@ class SptfyBrowseClient:
     Class managing Spotify Web API communication when looking in the "Browse" page
     """
 
-    def __init__(self, client_id, client_secret):
+    def __init__(self, client_id, client_secret, transport=None):
 
         """
         client_id: client id. Provided by Spotify when we register the app.
         client_secret: client secret. Provided by Spotify when we register the app.
+        transport: used to send requests (see spotify_transport). HTTP/1.1 (requests) is the default.
+        search_client: the SptfySearchClient used to obtain tokens. Shares the transport of this client.
         access_token: token obtained should authorisation be successful.
         expiration_time: time at which token expires.
         browse_url: the base URL when accessing the browse page.
@@ -24,6 +28,8 @@ class SptfyBrowseClient:
 
         self.client_id = client_id
         self.client_secret = client_secret
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.search_client = None
 
         self.browse_url = "https://api.spotify.com/v1/browse"
         self.categories_url = f"{self.browse_url}/categories"
@@ -32,6 +38,7 @@ class SptfyBrowseClient:
         self.access_token = None
         self.expiration_time = None
 
+    @accepts_deadline
     def get_access_token(self):
 
         """
@@ -40,7 +47,7 @@ class SptfyBrowseClient:
         If it doesn't exist, or is expired, it requests authorisation, and returns the new token.
         """
 
-        s = SptfySearchClient(client_id=self.client_id, client_secret=self.client_secret)
+        s = self.get_search_client()
 
         token = self.access_token
         expires = self.expiration_time
@@ -53,6 +60,19 @@ class SptfyBrowseClient:
 
         return token
 
+    def get_search_client(self):
+
+        """
+        Returns the SptfySearchClient used to obtain tokens, creating it the first time it is needed.
+        """
+
+        if self.search_client is None:
+            from spotify_search_client import SptfySearchClient  # used to search using the Spotify API
+            self.search_client = SptfySearchClient(client_id=self.client_id, client_secret=self.client_secret,
+                                                   transport=self.transport)
+
+        return self.search_client
+
     def get_request_url_dict(self, category_query="get_ids", country=None, locale=None, limit=20):
 
         """
@@ -124,6 +144,45 @@ class SptfyBrowseClient:
 
         return {"Authorization": f"Bearer {my_token}"}
 
+    @accepts_deadline
+    def get_conditional_response(self, url, etag=None):
+
+        """
+        Makes a conditional request: if the result hasn't changed since it was last retrieved (with the given ETag),
+        Spotify answers with 304 (Not Modified) and no content. Returns the response, so its status can be checked
+        (i.e 429 & its Retry-After header).
+        :param url: the URL of the request (i.e created with get_request_url)
+        :param etag: the ETag of the last response for the URL. If None, a normal request is made.
+        """
+
+        header = self.get_header()
+
+        if etag is not None:
+            header["If-None-Match"] = etag
+
+        return self.transport.get(url=url, headers=header)
+
+    @accepts_deadline
+    def get_if_changed(self, url, etag=None):
+
+        """
+        Makes a conditional request (see get_conditional_response)
+        Returns a (JSON, ETag) tuple. The JSON is None if the result hasn't changed, or the request failed.
+        :param url: the URL of the request (i.e created with get_request_url)
+        :param etag: the ETag of the last response for the URL. If None, a normal request is made.
+        """
+
+        r = self.get_conditional_response(url, etag)
+
+        if r.status_code == 304:
+            return None, etag
+        if r.status_code != 200:
+            print(f"Status Code: {r.status_code} ({url})")
+            return None, etag
+
+        return r.json(), r.headers.get("ETag")
+
+    @accepts_deadline
     def get_category_ids(self, country=None, locale=None, limit=20):
 
         """
@@ -139,11 +198,12 @@ class SptfyBrowseClient:
                                                locale=locale, limit=limit)
         header = self.get_header(token)
 
-        r = requests.get(url=category_id_url, headers=header)
+        r = self.transport.get(url=category_id_url, headers=header)
         print(f"Retrieving List of Categories: {r.status_code}\n")
 
         return r.json()
 
+    @accepts_deadline
     def print_category_ids(self, country=None, locale=None, limit=20):
 
         """
@@ -164,6 +224,7 @@ class SptfyBrowseClient:
             print(f"Category ID: {id}")
             print(f"Category Name: {name}\n")
 
+    @accepts_deadline
     def get_category(self, category_id="toplists", country=None, locale=None):
 
         """
@@ -181,12 +242,13 @@ class SptfyBrowseClient:
                                             locale=locale)
         header = self.get_header(token)
 
-        r = requests.get(url=category_url, headers=header)
+        r = self.transport.get(url=category_url, headers=header)
 
         print(f"Retrieving Category with ID {category_id}: {r.status_code}\n")
 
         return r.json()
 
+    @accepts_deadline
     def get_category_playlists(self, category_id="toplists", country=None, limit=20):
 
         """
@@ -203,12 +265,13 @@ class SptfyBrowseClient:
                                                      country=country, limit=limit)
         header = self.get_header(token)
 
-        r = requests.get(url=category_playlist_url, headers=header)
+        r = self.transport.get(url=category_playlist_url, headers=header)
 
         print(f"Retrieving Playlist(s) for Category with ID {category_id}: {r.status_code}\n")
 
         return r.json()
 
+    @accepts_deadline
     def print_category_playlists(self, category_id="toplists", country=None, limit=20):
 
         """
@@ -238,6 +301,7 @@ class SptfyBrowseClient:
             print(f"Playlist ID: {id}")
             print(f"Playlist URL: {url}\n")
 
+    @accepts_deadline
     def get_playlist_from_category(self, playlist_name, category_id="toplists", country=None):
 
         """
@@ -256,6 +320,7 @@ class SptfyBrowseClient:
 
         raise ValueError(f"{playlist_name} is not a playlist within the category {category_id}")
 
+    @accepts_deadline
     def get_new_releases(self, country=None, limit=20):
 
         """
@@ -271,12 +336,13 @@ class SptfyBrowseClient:
                                                      limit=limit)
         header = self.get_header(token)
 
-        r = requests.get(url=category_playlist_url, headers=header)
+        r = self.transport.get(url=category_playlist_url, headers=header)
 
         print(f"Retrieving New Releases: {r.status_code}\n")
 
         return r.json()
 
+    @accepts_deadline
     def print_new_releases(self, country=None, limit=20):
 
         """
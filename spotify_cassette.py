@@ -0,0 +1,269 @@
+import gzip  # used to compress cassettes
+import json  # used to store each request/response pair as a JSON line
+import time  # used to record & reproduce the timing of requests
+import threading  # used so that threads sharing the transport can record & replay at once
+
+from collections import defaultdict, deque  # used to replay the responses of each request in the recorded order
+from urllib.parse import urlencode  # used to store form bodies (i.e token requests) as Strings
+
+from spotify_deadline import get_timeout, check_deadline  # used so replayed delays don't outlast the deadline
+
+# Cassettes hold real request/response pairs, so client operations (and their performance) can be tested
+# again and again without the Spotify Web API.
+# A RecordingTransport wraps a real transport, and writes every request/response pair to a cassette.
+# A ReplayTransport answers the same requests from memory, without sending them.
+#
+# Cassettes are gzipped JSON lines files, with one request/response pair per line.
+# Request headers aren't stored (they hold the Authorization header), and access tokens in responses are redacted.
+
+redacted = "REDACTED"
+redacted_fields = {"access_token", "refresh_token"}
+
+
+class CassetteMissError(Exception):
+
+    """
+    Raised when a ReplayTransport is asked for a request that isn't in its cassette.
+    """
+
+
+class CassetteHeaders(dict):
+
+    """
+    Response headers, looked up regardless of case (like those of requests & httpx responses).
+    """
+
+    def __init__(self, headers):
+        super().__init__((name.lower(), value) for name, value in headers.items())
+
+    def __getitem__(self, name):
+        return super().__getitem__(name.lower())
+
+    def __contains__(self, name):
+        return super().__contains__(name.lower())
+
+    def get(self, name, default=None):
+        return super().get(name.lower(), default)
+
+
+class CassetteResponse:
+
+    """
+    A response read from a cassette, with the same attributes as the responses of the other transports.
+    """
+
+    def __init__(self, status_code, headers, text):
+        self.status_code = status_code
+        self.headers = CassetteHeaders(headers)
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def get_body(kwargs):
+
+    """
+    Returns the body of a request as a String, so requests can be matched to those in a cassette
+    :param kwargs: arguments of the request (i.e headers, data)
+    """
+
+    data = kwargs.get("data")
+
+    if data is None:
+        return ""
+    if isinstance(data, dict):
+        return urlencode(sorted(data.items()))
+    if isinstance(data, bytes):
+        return data.decode()
+
+    return data
+
+
+def redact(text):
+
+    """
+    Returns the text of a response, with its access & refresh tokens replaced by "REDACTED"
+    :param text: the text of the response
+    """
+
+    try:
+        content = json.loads(text)
+    except ValueError:
+        return text
+
+    if not isinstance(content, dict) or not redacted_fields.intersection(content):
+        return text
+
+    for field in redacted_fields.intersection(content):
+        content[field] = redacted
+
+    return json.dumps(content)
+
+
+class RecordingTransport:
+
+    """
+    Wraps a transport (see spotify_transport), writing every request/response pair to a cassette.
+    """
+
+    def __init__(self, transport, path):
+
+        """
+        transport: the transport used to send the requests.
+        path: the path of the cassette (i.e "cassettes/discography.jsonl.gz"). An existing cassette is overwritten.
+        start: the time (time.perf_counter) at which recording started, so each request's offset can be stored.
+        """
+
+        self.transport = transport
+        self.path = path
+
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+
+    def request(self, method, url, **kwargs):
+
+        """
+        Makes a request through the wrapped transport, records it, and returns the response
+        :param method: the HTTP method ("GET", "POST", "PUT" or "DELETE")
+        :param url: the URL of the request
+        :param kwargs: arguments of the request (i.e headers, data)
+        """
+
+        sent_at = time.perf_counter()
+        r = self.transport.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - sent_at
+
+        interaction = {"method": method, "url": url, "body": get_body(kwargs), "status_code": r.status_code,
+                       "headers": dict(r.headers), "text": redact(r.text),
+                       "offset": round(sent_at - self.start, 6), "elapsed": round(elapsed, 6)}
+
+        with self.lock:
+            self.file.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        self.transport.close()
+
+
+class ReplayTransport:
+
+    """
+    Answers requests from a cassette held in memory, without sending them.
+    The responses to the same request are replayed in the order they were recorded (the last one is repeated once
+    they run out), so requests can be made in a different order (i.e by more threads) than when they were recorded.
+    """
+
+    def __init__(self, path, timing="none"):
+
+        """
+        path: the path of the cassette.
+        timing: when each response is returned. Either "none" (at once), "original" (at the recorded offset from the
+        start of the recording, plus the recorded latency), or a number by which the recorded offsets & latencies are
+        multiplied (i.e 0.5 replays twice as fast).
+        interactions: the recorded responses, by (method, url, body).
+        start: the time (time.perf_counter) at which the replayed recording started, set by the first replayed request.
+        """
+
+        if timing not in ("none", "original") and not isinstance(timing, (int, float)):
+            raise ValueError(f"'{timing}' is not a valid timing. Use 'none', 'original' or a number")
+
+        self.path = path
+        self.timing = timing
+
+        self.interactions = defaultdict(deque)
+        self.lock = threading.Lock()
+        self.start = None
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                interaction = json.loads(line)
+                key = (interaction["method"], interaction["url"], interaction["body"])
+                self.interactions[key].append(interaction)
+
+    def get_delay(self, interaction):
+
+        """
+        Returns the number of seconds a replayed response takes, depending on the timing:
+        the time until the request's recorded offset (so the gaps between requests are kept), plus its recorded latency.
+        A request made later than its offset (i.e by a slower client) only waits for the latency.
+        :param interaction: the recorded request/response pair
+        """
+
+        if self.timing == "none":
+            return 0
+
+        scale = 1 if self.timing == "original" else self.timing
+        now = time.perf_counter()
+
+        with self.lock:
+            if self.start is None:
+                self.start = now - interaction["offset"] * scale  # the first request is replayed at its offset
+
+        return max(0.0, self.start + interaction["offset"] * scale - now) + interaction["elapsed"] * scale
+
+    def request(self, method, url, **kwargs):
+
+        """
+        Returns the recorded response to a request
+        Raises CassetteMissError if the request isn't in the cassette
+        The delay of the response is bounded by the timeout of the request & the deadline, like a real request:
+        if it is longer, DeadlineExceeded (or TimeoutError, for the timeout) is raised once the time has passed.
+        :param method: the HTTP method ("GET", "POST", "PUT" or "DELETE")
+        :param url: the URL of the request
+        :param kwargs: arguments of the request (i.e headers, data)
+        """
+
+        timeout = get_timeout(kwargs.get("timeout"))
+        key = (method, url, get_body(kwargs))
+
+        with self.lock:
+            responses = self.interactions.get(key)
+
+            if not responses:
+                raise CassetteMissError(f"{method} {url} isn't in cassette {self.path}")
+
+            interaction = responses.popleft() if len(responses) > 1 else responses[0]
+
+        delay = self.get_delay(interaction)
+
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            check_deadline()
+            raise TimeoutError(f"{method} {url} took longer than its timeout ({timeout:.1f} seconds)")
+
+        if delay > 0:
+            time.sleep(delay)
+
+        return CassetteResponse(interaction["status_code"], interaction["headers"], interaction["text"])
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        pass
@@ -0,0 +1,192 @@
+import time  # used to measure how much of a deadline is left
+import inspect  # used to tell generator methods apart
+import functools  # used to keep the names & docstrings of methods accepting a deadline
+
+from contextlib import contextmanager  # used to set the deadline of the code within a "with" statement
+from contextvars import ContextVar  # used to pass the deadline down to every request, without an argument
+
+# A deadline bounds how long a whole operation (i.e add_tracks_to_playlist: a token, a search per track and a POST)
+# may take. Public methods of the clients accept a "deadline" argument (a number of seconds, or a Deadline shared by
+# several calls), which applies to every request they make: token requests, sub-requests and retries.
+# Each request's timeout is the time left, and once the deadline has passed, requests fail fast with DeadlineExceeded.
+
+current_deadline = ContextVar("current_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+
+    """
+    Raised when an operation runs past its deadline.
+    partial: the results obtained before the deadline, for operations that can return partial results (otherwise None).
+    """
+
+    def __init__(self, message="The deadline has passed", partial=None):
+        super().__init__(message)
+        self.partial = partial
+
+
+class Deadline:
+
+    """
+    A point in time by which an operation must finish.
+    """
+
+    def __init__(self, seconds):
+
+        """
+        seconds: the number of seconds from now until the deadline.
+        expires_at: the time (time.monotonic) of the deadline.
+        """
+
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def get_remaining(self):
+
+        """
+        Returns the number of seconds left until the deadline (0 if it has passed)
+        """
+
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def has_expired(self):
+        return time.monotonic() >= self.expires_at
+
+
+def get_deadline():
+
+    """
+    Returns the Deadline of the current operation, or None if it has no deadline
+    """
+
+    return current_deadline.get()
+
+
+def check_deadline(partial=None):
+
+    """
+    Raises DeadlineExceeded if the deadline of the current operation has passed
+    :param partial: the results obtained so far, attached to the exception
+    """
+
+    deadline = current_deadline.get()
+
+    if deadline is not None and deadline.has_expired():
+        raise DeadlineExceeded(f"The deadline of {deadline.seconds} seconds has passed", partial=partial)
+
+
+def get_timeout(timeout=None):
+
+    """
+    Returns the timeout of a request: the time left until the deadline, or the given timeout if it is shorter
+    Raises DeadlineExceeded if the deadline has passed, so no request is sent
+    :param timeout: the timeout the request would have without a deadline (None for no timeout)
+    """
+
+    check_deadline()
+    deadline = current_deadline.get()
+
+    if deadline is None:
+        return timeout
+    if timeout is None:
+        return deadline.get_remaining()
+
+    return min(timeout, deadline.get_remaining())
+
+
+@contextmanager
+def use_deadline(deadline):
+
+    """
+    Applies a deadline to the code within a "with" statement
+    If the code already runs within an earlier deadline, the earlier one is kept.
+    :param deadline: a number of seconds, a Deadline, or None (no new deadline)
+    """
+
+    if deadline is None:
+        yield current_deadline.get()
+        return
+
+    if not isinstance(deadline, Deadline):
+        deadline = Deadline(deadline)
+
+    outer = current_deadline.get()
+    if outer is not None and outer.expires_at <= deadline.expires_at:
+        deadline = outer
+
+    token = current_deadline.set(deadline)
+
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(token)
+
+
+def propagate(function):
+
+    """
+    Returns a function running with the current deadline, to be run by another thread (i.e in a ThreadPoolExecutor),
+    which wouldn't otherwise know about the deadline
+    :param function: the function to run
+    """
+
+    deadline = current_deadline.get()
+
+    @functools.wraps(function)
+    def run(*args, **kwargs):
+        token = current_deadline.set(deadline)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            current_deadline.reset(token)
+
+    return run
+
+
+def until_deadline(results, partial):
+
+    """
+    Yields results (i.e from executor.map) until the deadline passes.
+    Then, DeadlineExceeded is raised again, with the results gathered so far as its partial results
+    :param results: an iterator of results
+    :param partial: the results gathered so far (i.e a dictionary the caller fills with each result)
+    """
+
+    try:
+        yield from results
+    except DeadlineExceeded as e:
+        raise DeadlineExceeded(str(e), partial=partial) from e
+
+
+def accepts_deadline(method):
+
+    """
+    Decorator adding a "deadline" argument to a method (a number of seconds, or a Deadline shared by several calls)
+    For generator methods (i.e get_discography), the deadline starts with the call, and applies to every step.
+    :param method: the method
+    """
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_with_deadline(*args, deadline=None, **kwargs):
+            if deadline is not None and not isinstance(deadline, Deadline):
+                deadline = Deadline(deadline)
+
+            generator = method(*args, **kwargs)
+
+            while True:
+                with use_deadline(deadline):
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                yield item
+
+        return generator_with_deadline
+
+    @functools.wraps(method)
+    def method_with_deadline(*args, deadline=None, **kwargs):
+        with use_deadline(deadline):
+            return method(*args, **kwargs)
+
+    return method_with_deadline
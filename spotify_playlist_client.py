@@ -1,33 +1,64 @@
-import requests  # used to make requests
-import navigator  # file containing code using selenium to automatically browse
 import json  # used to create JSON strings
+import time  # used to wait before retrying failed searches
 import datetime  # used to determine expiration time of token
+import threading  # used so that threads sharing a client request a single user token
 
 from urllib.parse import urlencode  # used to parse URLs for queries in Spotify
+from concurrent.futures import ThreadPoolExecutor  # used to create playlists & search for their tracks at once
 
-from spotify_search_client import SptfySearchClient  # used to search using the Spotify API
+from spotify_transport import RequestsTransport  # used to make requests
+from spotify_deadline import accepts_deadline, propagate, until_deadline, DeadlineExceeded  # used to bound how long operations take
 
+# navigator (and selenium) & spotify_search_client are imported when they are first needed,
+# so reading playlists doesn't require selenium, nor pay for importing it
+
+# "fields" queries used to only retrieve part of a playlist (None retrieves everything)
+# https://developer.spotify.com/documentation/web-api/reference/playlists/get-playlist/
+playlist_projections = {
+    "full": None,
+    "summary": "id,name,description,public,collaborative,snapshot_id,owner(id),tracks(total)",
+    "uris_only": "id,snapshot_id,tracks(total,next,items(track(uri)))"
+}
+
+playlist_tracks_projections = {
+    "full": None,
+    "summary": "total,next,items(added_at,track(name,uri,duration_ms,artists(name)))",
+    "uris_only": "total,next,items(track(uri))"
+}
 
 class SptfyPlaylistClient:
     """
     Class managing Spotify Web API communication when working with playlists
     """
 
-    def __init__(self, client_id, client_secret):
+    def __init__(self, client_id, client_secret, transport=None, token_cache=None):
 
         """
         client_id: client id. Provided by Spotify when we register the app.
         client_secret: client secret. Provided by Spotify when we register the app.
+        transport: used to send requests (see spotify_transport). HTTP/1.1 (requests) is the default.
+        search_client: the SptfySearchClient used to obtain tokens and search for tracks. Shares the transport of this client.
+        token_cache: a SharedTokenCache (see shared_state), used to share tokens with other processes. Optional.
         access_token: token obtained should authorisation be successful.
         expiration_time: time at which token expires.
+        user_token: token obtained using navigator, used to create & modify playlists.
+        user_expiration_time: time at which the user token expires.
+        token_lock: lock held while checking & requesting the user token, so the browser is only opened once.
         """
 
         self.client_id = client_id
         self.client_secret = client_secret
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.token_cache = token_cache
+        self.search_client = None
 
         self.access_token = None
         self.expiration_time = None
 
+        self.user_token = None
+        self.user_expiration_time = None
+        self.token_lock = threading.Lock()
+
     def get_request_body(self, playlist_name, public="false", collaborative="false", description="A playlist"):
 
         """
@@ -62,6 +93,7 @@ class SptfyPlaylistClient:
             "Content-Type": "application/json"
         }
 
+    @accepts_deadline
     def get_token(self, user_id, password, walkthrough_mode=False):
 
         """
@@ -73,17 +105,31 @@ class SptfyPlaylistClient:
         :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
         """
 
-        expires = self.expiration_time
-        now = datetime.datetime.now()
+        with self.token_lock:
+            expires = self.user_expiration_time
+            now = datetime.datetime.now()
 
-        if (self.access_token == None) or (expires == None) or (expires < now):
-            self.access_token = navigator.extract_token(user_id=user_id, password=password,
-                                                        walkthrough_mode=walkthrough_mode)
-            expires_in = 3600
-            self.expiration_time = now + datetime.timedelta(seconds=expires_in)
+            if (self.user_token == None) or (expires == None) or (expires < now):
+                try:
+                    import navigator  # file containing code using selenium to automatically browse
+                except ImportError:
+                    raise ImportError("Creating & modifying playlists requires selenium. Install it with: pip install selenium")
 
-        return self.access_token
+                def request_token():
+                    token = navigator.extract_token(user_id=user_id, password=password,
+                                                    walkthrough_mode=walkthrough_mode)
+                    expires_in = 3600
+                    return token, now + datetime.timedelta(seconds=expires_in)
 
+                if self.token_cache is not None:
+                    self.user_token, self.user_expiration_time = self.token_cache.get_token(f"user:{user_id}",
+                                                                                            request_token)
+                else:
+                    self.user_token, self.user_expiration_time = request_token()
+
+            return self.user_token
+
+    @accepts_deadline
     def get_access_token(self):
 
         """
@@ -95,7 +141,7 @@ class SptfyPlaylistClient:
         :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
         """
 
-        s = SptfySearchClient(client_id=self.client_id, client_secret=self.client_secret)
+        s = self.get_search_client()
 
         token = self.access_token
         expires = self.expiration_time
@@ -108,6 +154,19 @@ class SptfyPlaylistClient:
 
         return token
 
+    def get_search_client(self):
+
+        """
+        Returns the SptfySearchClient used to obtain tokens and search for tracks, creating it the first time it is needed.
+        """
+
+        if self.search_client is None:
+            from spotify_search_client import SptfySearchClient  # used to search using the Spotify API
+            self.search_client = SptfySearchClient(client_id=self.client_id, client_secret=self.client_secret,
+                                                   transport=self.transport, token_cache=self.token_cache)
+
+        return self.search_client
+
     def check_boolean_value(self, playlist_argument, playlist_parameter):
 
         """
@@ -127,6 +186,7 @@ class SptfyPlaylistClient:
 
         return my_parameter
 
+    @accepts_deadline
     def create_playlist(self, user_id, password, walkthrough_mode=False, playlist_name="Automated Playlist",
                         public="false", collaborative="false", description="A playlist"):
 
@@ -155,15 +215,37 @@ class SptfyPlaylistClient:
                                   description=description))
         header = self.get_header(token=token)
 
-        r = requests.post(user_playlist_url, data=request_body, headers=header)
+        r = self.transport.post(user_playlist_url, data=request_body, headers=header)
         print(f"Create Playlist: {r.status_code}")
         return r.json()["id"]
 
+    def post_playlist(self, user_id, request_body, header):
+
+        """
+        Creates a playlist from a request body (see get_request_body) & a header holding a user token.
+        Returns the id of the created playlist, or raises an Exception if it couldn't be created.
+        Used when creating many playlists with the same token, instead of create_playlist.
+        :param user_id: the username of the Spotify Account in which the playlist is to be created.
+        :param request_body: the request body of the playlist, as a dictionary.
+        :param header: the header of the request (see get_header)
+        """
+
+        r = self.transport.post(f"https://api.spotify.com/v1/users/{user_id}/playlists",
+                                data=json.dumps(request_body), headers=header)
+        print(f"Create Playlist '{request_body['name']}': {r.status_code}")
+
+        if r.status_code not in (200, 201):
+            raise Exception(f"Could not create playlist '{request_body['name']}': {r.status_code}")
+        return r.json()["id"]
+
+    @accepts_deadline
     def add_tracks_to_playlist(self, user_id, password, playlist_id, tracks, walkthrough_mode=False):
 
         """
         Given a list of songs, adds them to a playlist.
         If no list is provided, a ValueError is raised.
+        If the deadline passes whilst the songs are searched for, nothing is added, and DeadlineExceeded is raised
+        with the URIs found so far as its partial results.
         :param user_id: the username of the Spotify Account in which the playlist is to be created.
         :param password: the password of the Spotify Account in which the playlist is to be created.
         :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
@@ -172,19 +254,22 @@ class SptfyPlaylistClient:
         """
 
         if isinstance(tracks, list):
-            s = SptfySearchClient(client_id=self.client_id, client_secret=self.client_secret)
-            uri_tracks = [uri for uri in [s.get_track(track) for track in tracks]]
+            s = self.get_search_client()
+            uri_tracks = []
+            for uri in until_deadline((s.get_track(track) for track in tracks), uri_tracks):
+                uri_tracks.append(uri)
             playlist_url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
             token = self.get_token(user_id=user_id, password=password, walkthrough_mode=walkthrough_mode)
 
             header = self.get_header(token=token)
             request_body = json.dumps({"uris": uri_tracks})
 
-            r = requests.post(url=playlist_url, data=request_body, headers=header)
+            r = self.transport.post(url=playlist_url, data=request_body, headers=header)
             print(f"Add {len(tracks)} items to playlist {playlist_id}: {r.status_code}")
         else:
             raise ValueError("You need to provide a list of song names to add to a playlist")
 
+    @accepts_deadline
     def remove_tracks_from_playlist(self, user_id, password, playlist_id, remove_tracks,
                                     walkthrough_mode=False):
 
@@ -202,7 +287,7 @@ class SptfyPlaylistClient:
             playlist_url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
             token = self.get_token(user_id=user_id, password=password, walkthrough_mode=walkthrough_mode)
 
-            s = SptfySearchClient(client_id=self.client_id, client_secret=self.client_secret)
+            s = self.get_search_client()
 
             uri_tracks = [uri for uri in [s.get_track(track) for track in remove_tracks]]
             remove_tracks_dict_list = [{"uri": track_uri} for track_uri in uri_tracks]
@@ -210,58 +295,487 @@ class SptfyPlaylistClient:
 
             header = self.get_header(token=token)
 
-            r = requests.delete(playlist_url, data=request_body, headers=header)
+            r = self.transport.delete(playlist_url, data=request_body, headers=header)
             print(f"Remove {len(remove_tracks)} items from playlist {playlist_id}: {r.status_code}")
         else:
             raise TypeError("You need to provide a list of song names to remove from a playlist")
 
-    def get_playlist(self, playlist_id, market=None):
+    @accepts_deadline
+    def add_uris_to_playlist(self, user_id, password, playlist_id, uris, walkthrough_mode=False):
+
+        """
+        Given a list of track URIs, adds them to a playlist, 100 at a time (the most Spotify allows per request).
+        Unlike add_tracks_to_playlist, tracks aren't searched for. Returns the snapshot_id of the playlist.
+        :param user_id: the username of the Spotify Account that owns the playlist.
+        :param password: the password of the Spotify Account that owns the playlist.
+        :param playlist_id: the id of the playlist.
+        :param uris: a list of track URIs (i.e "spotify:track:7lEptt4wbM0yJTvSG5EBof")
+        :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
+        """
+
+        token = self.get_token(user_id=user_id, password=password, walkthrough_mode=walkthrough_mode)
+
+        return self.post_uris(playlist_id, uris, self.get_header(token=token))
+
+    def post_uris(self, playlist_id, uris, header):
+
+        """
+        Adds a list of track URIs to a playlist, 100 at a time, with a header holding a user token.
+        Returns the snapshot_id of the playlist. Used by add_uris_to_playlist, and when modifying many playlists with
+        the same token.
+        :param playlist_id: the id of the playlist.
+        :param uris: a list of track URIs (i.e "spotify:track:7lEptt4wbM0yJTvSG5EBof")
+        :param header: the header of the requests (see get_header)
+        """
+
+        playlist_url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
+        snapshot_id = None
+
+        for i in range(0, len(uris), 100):
+            request_body = json.dumps({"uris": uris[i:i + 100]})
+
+            r = self.transport.post(url=playlist_url, data=request_body, headers=header)
+            print(f"Add {len(uris[i:i + 100])} items to playlist {playlist_id}: {r.status_code}")
+
+            if r.status_code not in (200, 201):
+                raise Exception(f"Could not add tracks to playlist {playlist_id}: {r.status_code}")
+            snapshot_id = r.json().get("snapshot_id")
+
+        return snapshot_id
+
+    @accepts_deadline
+    def get_user_playlists(self, user_id, password, walkthrough_mode=False):
+
+        """
+        Returns the names & ids of the playlists owned by a user, as a dictionary (i.e {"My Favourite Songs": "<id>"})
+        Playlists the user follows, but doesn't own, are left out.
+        :param user_id: the username of the Spotify Account.
+        :param password: the password of the Spotify Account.
+        :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
+        """
+
+        token = self.get_token(user_id=user_id, password=password, walkthrough_mode=walkthrough_mode)
+        header = self.get_header(token=token)
+
+        url = f"https://api.spotify.com/v1/users/{user_id}/playlists?limit=50"
+        playlists = {}
+
+        while url:
+            r = self.transport.get(url=url, headers=header)
+
+            if r.status_code != 200:
+                raise Exception(f"Could not get the playlists of user {user_id}: {r.status_code}")
+
+            page = r.json()
+
+            for playlist in page.get("items", []):
+                if playlist["owner"]["id"] == user_id:
+                    playlists.setdefault(playlist["name"], playlist["id"])
+
+            url = page.get("next")
+
+        return playlists
+
+    @accepts_deadline
+    def resolve_tracks(self, tracks, max_workers=8, attempts=3, retry_delay=1):
+
+        """
+        Searches for several song names at once, and returns their URIs as a dictionary (i.e {"Stan": "spotify:track:..."})
+        Each name is only searched for once. Names with no search results are left out.
+        Failed searches (i.e 429 or 5xx responses) are retried, waiting retry_delay seconds (doubled with each retry).
+        If a search still fails, an Exception is raised, rather than leaving the song out.
+        If the deadline passes, DeadlineExceeded is raised, with the URIs found so far as its partial results
+        :param tracks: a list of song names.
+        :param max_workers: the maximum number of searches made at once.
+        :param attempts: the number of times each search is made, if it keeps failing.
+        :param retry_delay: the number of seconds waited before the first retry.
+        """
+
+        s = self.get_search_client()
+        s.get_access_token()  # the searches of every song are sent with this token
+
+        def resolve(track):
+            for attempt in range(attempts):
+                try:
+                    return track, s.get_track(track)
+                except IndexError:
+                    print(f"No track found for '{track}'")
+                    return track, None
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    if attempt == attempts - 1:
+                        raise
+                    print(f"{e}. Retrying in {retry_delay * 2 ** attempt} seconds")
+                    time.sleep(retry_delay * 2 ** attempt)
+
+        uris = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for track, uri in until_deadline(executor.map(propagate(resolve), dict.fromkeys(tracks)), uris):
+                if uri is not None:
+                    uris[track] = uri
+
+        return uris
+
+    @accepts_deadline
+    def create_playlists(self, user_id, password, manifest, walkthrough_mode=False, max_workers=8):
+
+        """
+        Creates several playlists at once, and fills them with their tracks. Returns the ids of the playlists by name.
+        The tracks of every playlist are searched for together, so a song found in several playlists is only searched for once.
+        Playlists are identified by their name & owner: if the user already owns a playlist with the same name,
+        it isn't created again, and only the tracks it doesn't contain yet are added. So a manifest can safely be run again.
+        If no list is provided, a TypeError is raised.
+        :param user_id: the username of the Spotify Account in which the playlists are to be created.
+        :param password: the password of the Spotify Account in which the playlists are to be created.
+        :param manifest: a list of dictionaries, one per playlist, with a "name", a list of song names ("tracks"),
+        and optionally "public", "collaborative" & "description" (as in create_playlist).
+        i.e [{"name": "Eminem Classics", "tracks": ["Stan", "Without Me"], "public": "true"}]
+        :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
+        :param max_workers: the maximum number of requests made at once.
+        """
+
+        if not isinstance(manifest, list):
+            raise TypeError("You need to provide a list of playlists to create")
+
+        names = [entry["name"] for entry in manifest]
+        if len(set(names)) != len(names):
+            raise ValueError("Playlist names must be unique within a manifest, as they identify the playlists")
+
+        token = self.get_token(user_id=user_id, password=password, walkthrough_mode=walkthrough_mode)
+        header = self.get_header(token=token)
+        existing_playlists = self.get_user_playlists(user_id, password, walkthrough_mode=walkthrough_mode)
+
+        # the request body of each playlist is checked once, before any playlist is created
+        request_bodies = {entry["name"]: self.get_request_body(
+            entry["name"], public=self.check_boolean_value("public", str(entry.get("public", "false"))),
+            collaborative=self.check_boolean_value("collaborative", str(entry.get("collaborative", "false"))),
+            description=entry.get("description", "A playlist")) for entry in manifest}
+
+        uris = self.resolve_tracks([track for entry in manifest for track in entry.get("tracks", [])],
+                                   max_workers=max_workers)
+
+        def create(entry):
+            playlist_id = existing_playlists.get(entry["name"])
+            playlist_uris = [uris[track] for track in entry.get("tracks", []) if track in uris]
+
+            if playlist_id is None:
+                playlist_id = self.post_playlist(user_id, request_bodies[entry["name"]], header)
+            else:
+                print(f"Playlist '{entry['name']}' already exists ({playlist_id})")
+                contained = set()
+                for page in self.get_playlist_track_pages(playlist_id, projection="uris_only", token=token):
+                    contained.update(self.check_playlist_response(page, playlist_id)["uris"])
+                playlist_uris = [uri for uri in playlist_uris if uri not in contained]
+
+            if playlist_uris:
+                self.post_uris(playlist_id, playlist_uris, header)
+
+            return entry["name"], playlist_id
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(executor.map(propagate(create), manifest))
+
+    def check_playlist_response(self, playlist_json, playlist_id):
+
+        """
+        Raises an Exception if a playlist (or a page of its tracks) couldn't be read (i.e 401, 404 or 429)
+        Returns the JSON otherwise
+        :param playlist_json: the JSON returned by get_playlist or get_playlist_tracks.
+        :param playlist_id: the id of the playlist.
+        """
+
+        if "error" in playlist_json:
+            error = playlist_json["error"]
+            if isinstance(error, dict):
+                error = f"{error.get('status')} {error.get('message', '')}"
+            raise Exception(f"Could not read playlist {playlist_id}: {error}")
+
+        return playlist_json
+
+    @accepts_deadline
+    def get_snapshot_id(self, playlist_id, token=None):
+
+        """
+        Returns the snapshot_id of a playlist. Raises an Exception if the playlist can't be read.
+        :param playlist_id: the id of the playlist.
+        :param token: a user token (see get_token), required to read private playlists. Optional.
+        """
+
+        summary = self.check_playlist_response(self.get_playlist(playlist_id, projection="summary", token=token),
+                                               playlist_id)
+
+        return summary["snapshot_id"]
+
+    @accepts_deadline
+    def get_duplicate_positions(self, playlist_id, token, by_isrc=False):
+
+        """
+        Reads a playlist once, and returns its snapshot_id & the positions of every duplicate track (by URI),
+        as a dictionary (i.e {"spotify:track:...": [4, 9]}). The first occurrence of a track isn't a duplicate.
+        :param playlist_id: the id of the playlist.
+        :param token: a user token (see get_token).
+        :param by_isrc: whether tracks with the same ISRC (the same recording, released more than once) are also duplicates.
+        """
+
+        fields = "total,next,items(track(uri,external_ids(isrc)))"
+        snapshot_id = self.get_snapshot_id(playlist_id, token)
+
+        seen = set()
+        duplicates = {}
+        position = 0
+
+        for page in self.get_playlist_track_pages(playlist_id, projection=fields, token=token):
+            self.check_playlist_response(page, playlist_id)
+
+            for item in page.get("items", []):
+                track = item.get("track")
+
+                if track:
+                    isrc = track.get("external_ids", {}).get("isrc")
+                    key = isrc if by_isrc and isrc else track["uri"]
+
+                    if key in seen:
+                        duplicates.setdefault(track["uri"], []).append(position)
+                    seen.add(key)
+
+                position += 1
+
+        return snapshot_id, duplicates
+
+    @accepts_deadline
+    def dedupe_playlist(self, user_id, password, playlist_id, by_isrc=False, walkthrough_mode=False, attempts=3):
+
+        """
+        Removes the duplicate tracks of a playlist, keeping the first occurrence of each track. Returns the number of tracks removed.
+        Only the extra occurrences are removed (by position), 100 at a time, from the last to the first,
+        so the positions of the tracks still to be removed don't change.
+        Every removal is made against the snapshot_id it was computed for. If the playlist changes whilst it is being read,
+        it is read again (up to "attempts" times).
+        :param user_id: the username of the Spotify Account that owns (or collaborates on) the playlist.
+        :param password: the password of the Spotify Account.
+        :param playlist_id: the id of the playlist.
+        :param by_isrc: whether tracks with the same ISRC (the same recording, released more than once) are also duplicates.
+        :param walkthrough_mode: a boolean value used to determine whether the user sees the token obtaining process
+        :param attempts: the number of times the playlist is read, if it keeps changing whilst it is read.
+        """
+
+        token = self.get_token(user_id=user_id, password=password, walkthrough_mode=walkthrough_mode)
+        header = self.get_header(token=token)
+
+        for _ in range(attempts):
+            snapshot_id, duplicates = self.get_duplicate_positions(playlist_id, token, by_isrc=by_isrc)
+
+            if self.get_snapshot_id(playlist_id, token) == snapshot_id:
+                break
+            print(f"Playlist {playlist_id} changed whilst it was read. Reading it again")
+        else:
+            raise Exception(f"Playlist {playlist_id} kept changing whilst it was read")
+
+        positions = sorted(((position, uri) for uri, uri_positions in duplicates.items() for position in uri_positions),
+                           reverse=True)
+        playlist_url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
+
+        for i in range(0, len(positions), 100):
+            batch = {}
+            for position, uri in positions[i:i + 100]:
+                batch.setdefault(uri, []).append(position)
+
+            request_body = json.dumps({"tracks": [{"uri": uri, "positions": uri_positions}
+                                                  for uri, uri_positions in batch.items()],
+                                       "snapshot_id": snapshot_id})
+
+            r = self.transport.delete(playlist_url, data=request_body, headers=header)
+            print(f"Remove {len(positions[i:i + 100])} duplicates from playlist {playlist_id}: {r.status_code}")
+
+            if r.status_code != 200:
+                raise Exception(f"Could not remove duplicates from playlist {playlist_id}: {r.status_code}")
+            snapshot_id = r.json()["snapshot_id"]
+
+        return len(positions)
+
+    def get_fields(self, projection="full", playlist_tracks=False):
+
+        """
+        Returns the "fields" query used to only retrieve part of a playlist.
+        If the projection isn't one of the presets, it is treated as a raw Spotify "fields" String.
+        :param projection: the name of a preset ("full", "summary" or "uris_only"), or a raw "fields" String.
+        :param playlist_tracks: whether the fields are for the playlist's tracks (True) or the playlist itself (False).
+        """
+
+        presets = playlist_tracks_projections if playlist_tracks else playlist_projections
+
+        if projection in presets:
+            return presets[projection]
+
+        return projection
+
+    def decode_playlist(self, playlist, projection="full"):
+
+        """
+        Turns a playlist obtained with a projection into a smaller dictionary.
+        Playlists obtained using "full" or a raw "fields" String are returned as they are.
+        Error responses (i.e {"error": {"status": 404, "message": "..."}}) are also returned as they are.
+        :param playlist: the JSON returned by the Spotify API for a playlist.
+        :param projection: the projection used to get the playlist.
+        """
+
+        if "error" in playlist:
+            return playlist
+
+        if projection == "summary":
+            return {
+                "id": playlist.get("id"),
+                "name": playlist.get("name"),
+                "description": playlist.get("description"),
+                "public": playlist.get("public"),
+                "collaborative": playlist.get("collaborative"),
+                "snapshot_id": playlist.get("snapshot_id"),
+                "owner": playlist.get("owner", {}).get("id"),
+                "total": playlist.get("tracks", {}).get("total")
+            }
+        elif projection == "uris_only":
+            tracks = self.decode_playlist_tracks(playlist.get("tracks", {}), projection="uris_only")
+            tracks["id"] = playlist.get("id")
+            tracks["snapshot_id"] = playlist.get("snapshot_id")
+            return tracks
+
+        return playlist
+
+    def decode_playlist_tracks(self, playlist_tracks, projection="full"):
+
+        """
+        Turns the tracks of a playlist obtained with a projection into a smaller dictionary.
+        Tracks obtained using "full" or a raw "fields" String are returned as they are.
+        Local files and removed tracks (with no track object) are skipped.
+        Error responses (i.e {"error": {"status": 404, "message": "..."}}) are returned as they are.
+        :param playlist_tracks: the JSON returned by the Spotify API for the tracks of a playlist.
+        :param projection: the projection used to get the tracks.
+        """
+
+        if "error" in playlist_tracks:
+            return playlist_tracks
+
+        items = [item for item in playlist_tracks.get("items", []) if item.get("track")]
+
+        if projection == "summary":
+            return {
+                "total": playlist_tracks.get("total"),
+                "next": playlist_tracks.get("next"),
+                "items": [{
+                    "name": item["track"].get("name"),
+                    "uri": item["track"].get("uri"),
+                    "duration_ms": item["track"].get("duration_ms"),
+                    "artists": [artist["name"] for artist in item["track"].get("artists", [])],
+                    "added_at": item.get("added_at")
+                } for item in items]
+            }
+        elif projection == "uris_only":
+            return {
+                "total": playlist_tracks.get("total"),
+                "next": playlist_tracks.get("next"),
+                "uris": [item["track"]["uri"] for item in items]
+            }
+
+        return playlist_tracks
+
+    @accepts_deadline
+    def get_playlist(self, playlist_id, market=None, projection="full", token=None):
 
         """
         Given a playlist_id and its market, returns a JSON containing the playlist's information.
         :param playlist_id: the id of the playlist.
         :param market: an ISO 3166-1 alpha-2 country code, for the market of interest.
+        :param projection: the part of the playlist to retrieve. Either a preset ("full", "summary" or "uris_only"),
+        or a raw "fields" String, as described by the Spotify API. Presets are decoded using decode_playlist.
+        :param token: a user token (see get_token), required to read private playlists. If None, get_access_token is used.
         """
 
-        token = self.get_access_token()
+        if token is None:
+            token = self.get_access_token()
         header = {"Authorization": f"Bearer {token}"}
 
         url = f"https://api.spotify.com/v1/playlists/{playlist_id}"
 
+        query_dict = {}
+        fields = self.get_fields(projection)
+
         if market != None:
-            query = urlencode({"market": market})
-            url = f"{url}?{query}"
+            query_dict["market"] = market
+        if fields != None:
+            query_dict["fields"] = fields
+
+        if query_dict:
+            url = f"{url}?{urlencode(query_dict)}"
 
-        r = requests.get(url=url, headers=header)
+        r = self.transport.get(url=url, headers=header)
 
         print(f"Get Playlist with ID {playlist_id}: {r.status_code}")
 
-        return r.json()
+        return self.decode_playlist(r.json(), projection=projection)
 
-    def get_playlist_tracks(self, playlist_id, market=None, limit=20):
+    @accepts_deadline
+    def get_playlist_tracks(self, playlist_id, market=None, limit=20, offset=0, projection="full", token=None):
 
         """
         Given a playlist_id and its market, returns a JSON containing the playlist's information.
         :param playlist_id: the id of the playlist.
         :param market: an ISO 3166-1 alpha-2 country code, for the market of interest.
-        :param limit: the number of tracks returned.
+        :param limit: the number of tracks returned. Minimum: 1. Maximum: 100.
+        :param offset: the index of the first track to return.
+        :param projection: the part of the tracks to retrieve. Either a preset ("full", "summary" or "uris_only"),
+        or a raw "fields" String, as described by the Spotify API. Presets are decoded using decode_playlist_tracks.
+        :param token: a user token (see get_token), required to read private playlists. If None, get_access_token is used.
         """
 
-        token = self.get_access_token()
+        if token is None:
+            token = self.get_access_token()
         header = {"Authorization": f"Bearer {token}"}
 
         url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
 
+        query_dict = {"limit": limit, "offset": offset}
+        fields = self.get_fields(projection, playlist_tracks=True)
+
         if market != None:
-            query = urlencode({"market": market, "limit": limit})
-            url = f"{url}?{query}"
+            query_dict["market"] = market
+        if fields != None:
+            query_dict["fields"] = fields
+
+        url = f"{url}?{urlencode(query_dict)}"
 
-        r = requests.get(url=url, headers=header)
+        r = self.transport.get(url=url, headers=header)
 
         print(f"Get Tracks from Playlist with ID {playlist_id}: {r.status_code}")
 
-        return r.json()
+        return self.decode_playlist_tracks(r.json(), projection=projection)
+
+    @accepts_deadline
+    def get_playlist_track_pages(self, playlist_id, market=None, projection="full", token=None):
+
+        """
+        Yields every page of tracks of a playlist (100 tracks per page), as returned by get_playlist_tracks.
+        Pages are requested as they are needed, so the whole playlist is never held in memory.
+        :param playlist_id: the id of the playlist.
+        :param market: an ISO 3166-1 alpha-2 country code, for the market of interest.
+        :param projection: the part of the tracks to retrieve (see get_playlist_tracks).
+        The projection must include "next" (all presets do).
+        :param token: a user token (see get_token), required to read private playlists. Optional.
+        """
+
+        offset = 0
+
+        while True:
+            page = self.get_playlist_tracks(playlist_id, market=market, limit=100, offset=offset, projection=projection,
+                                            token=token)
+            yield page
+
+            if not page.get("next"):
+                break
+            offset += 100
 
+    @accepts_deadline
     def get_playlist_id(self, playlist_name):
 
         """
@@ -272,7 +786,7 @@ class SptfyPlaylistClient:
         :param playlist_name: the name of the playlist.
         """
 
-        s = SptfySearchClient(client_id=self.client_id, client_secret=self.client_secret)
+        s = self.get_search_client()
         playlists_found = s.search({"playlist": playlist_name}, content_type="playlist", limit=50)
 
         for playlist in playlists_found["playlists"]["items"]:
@@ -0,0 +1,327 @@
+import time  # used to measure latencies & time circuit breakers
+import hashlib  # used to key stale responses by the token they were requested with, without keeping the token
+import threading  # used so that threads sharing the transport see a consistent state
+
+from collections import deque, OrderedDict  # used to keep recent latencies & recent responses
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED  # used to send hedged requests
+from urllib.parse import urlparse  # used to find the endpoint of a URL
+
+from spotify_deadline import propagate  # used to pass the deadline of the request to the hedged requests
+
+# path segments naming an endpoint. Any other segment (i.e an id) is left out of the endpoint's name
+endpoint_names = {"search", "artists", "albums", "tracks", "playlists", "browse", "categories", "new-releases",
+                  "featured-playlists", "audio-features", "top-tracks", "related-artists", "recommendations",
+                  "users", "me", "api", "token"}
+
+
+class CircuitOpenError(Exception):
+
+    """
+    Raised when a request is made to an endpoint whose circuit is open (it keeps failing), and no stale response is available.
+    """
+
+
+def get_endpoint(url):
+
+    """
+    Returns the name of the endpoint of a URL, without ids
+    i.e "https://api.spotify.com/v1/artists/<id>/top-tracks?country=GB" => "artists/top-tracks"
+    :param url: the URL of the request
+    """
+
+    segments = [segment for segment in urlparse(url).path.split("/") if segment in endpoint_names]
+
+    return "/".join(segments) or "other"
+
+
+class EndpointState:
+
+    """
+    Recent latencies & circuit breaker state of a single endpoint.
+    """
+
+    def __init__(self, samples=100):
+
+        """
+        latencies: the latency (in seconds) of the most recent successful requests.
+        failures: the number of consecutive failed requests.
+        open_until: the time (time.monotonic) until which the circuit is open. 0 if it is closed.
+        trial_in_progress: whether a request is testing if the endpoint has recovered (half-open circuit).
+        """
+
+        self.latencies = deque(maxlen=samples)
+        self.failures = 0
+        self.open_until = 0
+        self.trial_in_progress = False
+
+    def get_percentile(self, percentile):
+
+        """
+        Returns a percentile of the recent latencies
+        :param percentile: the percentile (between 0 and 100)
+        """
+
+        latencies = sorted(self.latencies)
+
+        return latencies[int(percentile / 100 * (len(latencies) - 1))]
+
+
+class ResilientTransport:
+
+    """
+    Wraps a transport (see spotify_transport), adding:
+    - per-endpoint timeouts, so no request waits indefinitely.
+    - hedged requests: if a GET request takes longer than a percentile of the endpoint's recent latencies,
+    a duplicate request is sent, and whichever response arrives first is used.
+    - a circuit breaker: if an endpoint keeps failing, requests to it fail fast (raising CircuitOpenError),
+    or are answered with the last successful response for the same URL & token (a stale response).
+    """
+
+    def __init__(self, transport, timeouts=None, default_timeout=10, hedge_percentile=None, hedge_min_samples=20,
+                 failure_threshold=5, reset_timeout=30, serve_stale=True, stale_size=1000, max_workers=16):
+
+        """
+        transport: the transport used to send the requests.
+        timeouts: a dictionary of timeouts (in seconds) by endpoint (i.e {"search": 3, "artists/top-tracks": 5}).
+        default_timeout: the timeout for endpoints not in timeouts.
+        hedge_percentile: the percentile of recent latencies after which a duplicate request is sent (i.e 95).
+        If None, requests aren't hedged.
+        hedge_min_samples: the number of latencies recorded for an endpoint before its requests are hedged.
+        failure_threshold: the number of consecutive failures after which an endpoint's circuit opens.
+        reset_timeout: the number of seconds a circuit stays open, before a request tests if the endpoint recovered.
+        serve_stale: whether to answer requests to an open circuit with the last successful response for the URL,
+        requested with the same token (so a private playlist read with a user token is never served to another caller).
+        stale_size: the number of successful GET responses kept to be served as stale responses.
+        max_workers: the maximum number of requests (including duplicates) sent at once when hedging.
+        """
+
+        self.transport = transport
+        self.timeouts = timeouts if timeouts is not None else {}
+        self.default_timeout = default_timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.serve_stale = serve_stale
+        self.stale_size = stale_size
+
+        self.endpoints = {}
+        self.stale_responses = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers) if hedge_percentile is not None else None
+
+    def get_endpoint_state(self, endpoint):
+
+        """
+        Returns the EndpointState of an endpoint, creating it for the first request
+        :param endpoint: the name of the endpoint
+        """
+
+        with self.lock:
+            if endpoint not in self.endpoints:
+                self.endpoints[endpoint] = EndpointState()
+            return self.endpoints[endpoint]
+
+    def get_timeout(self, endpoint, timeout=None):
+
+        """
+        Returns the timeout of a request to an endpoint
+        :param endpoint: the name of the endpoint
+        :param timeout: a timeout given by the caller. The shortest timeout is used.
+        """
+
+        endpoint_timeout = self.timeouts.get(endpoint, self.default_timeout)
+
+        if timeout is None:
+            return endpoint_timeout
+
+        return min(timeout, endpoint_timeout)
+
+    def allow_request(self, state):
+
+        """
+        Returns whether a request can be sent to an endpoint, depending on its circuit
+        Once an open circuit's reset_timeout has passed, a single request is allowed through to test the endpoint
+        :param state: the EndpointState of the endpoint
+        """
+
+        with self.lock:
+            if state.open_until == 0:
+                return True
+            if time.monotonic() >= state.open_until and not state.trial_in_progress:
+                state.trial_in_progress = True
+                return True
+            return False
+
+    def record_result(self, endpoint, state, succeeded, latency=None):
+
+        """
+        Updates the latencies & circuit of an endpoint after a request
+        :param endpoint: the name of the endpoint
+        :param state: the EndpointState of the endpoint
+        :param succeeded: whether the request succeeded
+        :param latency: the latency of the request, in seconds
+        """
+
+        with self.lock:
+            state.trial_in_progress = False
+
+            if succeeded:
+                state.failures = 0
+                state.open_until = 0
+                state.latencies.append(latency)
+                return
+
+            state.failures += 1
+
+            if state.failures >= self.failure_threshold:
+                if state.open_until == 0:
+                    print(f"Endpoint '{endpoint}' failed {state.failures} times in a row. "
+                          f"Opening its circuit for {self.reset_timeout} seconds")
+                state.open_until = time.monotonic() + self.reset_timeout
+
+    @staticmethod
+    def get_stale_key(url, headers):
+
+        """
+        Returns the key of a stale response: its URL, and a hash of the Authorization header it was requested with
+        """
+
+        authorization = (headers or {}).get("Authorization", "")
+
+        return url, hashlib.sha256(authorization.encode()).hexdigest()
+
+    def get_stale_response(self, method, url, headers=None):
+
+        """
+        Returns the last successful response for a URL & token, or None if there isn't one
+        (or stale responses aren't served)
+        """
+
+        with self.lock:
+            if method == "GET" and self.serve_stale:
+                return self.stale_responses.get(self.get_stale_key(url, headers))
+            return None
+
+    def store_stale_response(self, url, response, headers=None):
+
+        """
+        Keeps a successful response, to be served if the endpoint starts failing. The oldest responses are dropped.
+        """
+
+        key = self.get_stale_key(url, headers)
+
+        with self.lock:
+            self.stale_responses[key] = response
+            self.stale_responses.move_to_end(key)
+
+            if len(self.stale_responses) > self.stale_size:
+                self.stale_responses.popitem(last=False)
+
+    def send(self, method, url, **kwargs):
+
+        """
+        Sends a single request, and returns the response alongside its latency
+        """
+
+        start = time.perf_counter()
+        r = self.transport.request(method, url, **kwargs)
+
+        return r, time.perf_counter() - start
+
+    def send_hedged(self, state, method, url, **kwargs):
+
+        """
+        Sends a request. If it takes longer than the hedge percentile of the endpoint's recent latencies,
+        sends a duplicate request, and returns whichever response arrives first
+        Only used for GET requests, which can safely be sent twice
+        """
+
+        if self.executor is None or method != "GET" or len(state.latencies) < self.hedge_min_samples:
+            return self.send(method, url, **kwargs)
+
+        hedge_delay = state.get_percentile(self.hedge_percentile)
+
+        primary = self.executor.submit(propagate(self.send), method, url, **kwargs)
+        done, _ = wait([primary], timeout=hedge_delay)
+
+        if done:
+            return primary.result()
+
+        duplicate = self.executor.submit(propagate(self.send), method, url, **kwargs)
+        pending = {primary, duplicate}
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                # if one of the requests fails, wait for the other one
+                if future.exception() is None or not pending:
+                    return future.result()
+
+    def request(self, method, url, **kwargs):
+
+        """
+        Makes a request (with a timeout, hedging & a circuit breaker), and returns the response
+        Raises CircuitOpenError if the endpoint's circuit is open and no stale response is available
+        :param method: the HTTP method ("GET", "POST", "PUT" or "DELETE")
+        :param url: the URL of the request
+        :param kwargs: arguments of the request (i.e headers, data, timeout)
+        """
+
+        endpoint = get_endpoint(url)
+        state = self.get_endpoint_state(endpoint)
+
+        if not self.allow_request(state):
+            stale_response = self.get_stale_response(method, url, kwargs.get("headers"))
+
+            if stale_response is not None:
+                print(f"Endpoint '{endpoint}' is failing. Serving a stale response")
+                return stale_response
+
+            raise CircuitOpenError(f"Endpoint '{endpoint}' is failing. Try again in {self.reset_timeout} seconds")
+
+        kwargs["timeout"] = self.get_timeout(endpoint, kwargs.get("timeout"))
+
+        try:
+            r, latency = self.send_hedged(state, method, url, **kwargs)
+        except Exception:
+            self.record_result(endpoint, state, succeeded=False)
+            raise
+
+        # client errors (i.e 404) are the caller's problem, not the endpoint's
+        succeeded = r.status_code < 500
+        self.record_result(endpoint, state, succeeded=succeeded, latency=latency)
+
+        if r.status_code == 200 and method == "GET":
+            self.store_stale_response(url, r, kwargs.get("headers"))
+
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def get_latency_percentiles(self, percentiles=(50, 95, 99)):
+
+        """
+        Returns the given percentiles of the recent latencies (in seconds) of every endpoint
+        :param percentiles: the percentiles (between 0 and 100)
+        """
+
+        with self.lock:
+            return {endpoint: {p: state.get_percentile(p) for p in percentiles}
+                    for endpoint, state in self.endpoints.items() if state.latencies}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.transport.close()
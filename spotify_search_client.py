@@ -1,7 +1,10 @@
-import requests  # used to make requests
 import base64  # used for token request header
 import datetime  # used to determine expiration time of token
+import threading  # used so that threads sharing a client request a single token
 from urllib.parse import urlencode  # used to parse URLs for queries in Spotify
+from concurrent.futures import ThreadPoolExecutor, as_completed  # used to make several requests at once
+from spotify_transport import RequestsTransport  # used to make requests
+from spotify_deadline import accepts_deadline, propagate, until_deadline  # used to bound how long operations take
 
 class SptfySearchClient:
 
@@ -9,21 +12,32 @@ class SptfySearchClient:
     Class managing Spotify Web API communication when searching for artists, albums, playlists, etc...
     """
 
-    def __init__(self, client_id, client_secret):
+    def __init__(self, client_id, client_secret, transport = None, token_cache = None, track_index = None,
+                 resource_cache = None):
 
         """
         client_id: client id. Provided by Spotify when we register the app.
         client_secret: client secret. Provided by Spotify when we register the app.
+        transport: used to send requests (see spotify_transport). HTTP/1.1 (requests) is the default.
+        token_cache: a SharedTokenCache (see shared_state), used to share the token with other processes. Optional.
+        track_index: a TrackIndex (see track_index), to which every fetched track, album & artist is added,
+        and which get_track looks up before searching. Optional.
+        resource_cache: a ResourceCache (see resource_cache), used to answer repeated get_resource & get_json requests. Optional.
         request_body: request body for the "Clients Credentials Flow" token request.
         token_url: URL to request token.
         base_url: base URL for communicating with the API.
         access_token: token obtained should authorisation be succesful.
         expiration_time: time at which token expires.
         access_token_expired: boolean to determine whether token has expired.
+        token_lock: lock held while checking & refreshing the token, so concurrent requests share a single token.
         """
 
         self.client_id = client_id
         self.client_secret = client_secret
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.token_cache = token_cache
+        self.track_index = track_index
+        self.resource_cache = resource_cache
 
         self.request_body = {"grant_type" : "client_credentials"}
         self.token_url = "https://accounts.spotify.com/api/token"
@@ -32,6 +46,7 @@ class SptfySearchClient:
         self.access_token = None
         self.expiration_time = None
         self.access_token_expired = True
+        self.token_lock = threading.RLock()
 
     def credentials_to_base64(self):
 
@@ -63,7 +78,7 @@ class SptfySearchClient:
         If successful, we obtain a token
         """
 
-        r = requests.post(self.token_url, data = self.request_body, headers = self.get_token_header())
+        r = self.transport.post(self.token_url, data = self.request_body, headers = self.get_token_header())
 
         if r.status_code != 200:
             raise Exception("Client couldn't be authenticated")
@@ -79,6 +94,17 @@ class SptfySearchClient:
 
         return True
 
+    def request_token(self):
+
+        """
+        Requests a new token, and returns it alongside its expiration time
+        Used by a shared token cache, when the shared token has expired
+        """
+
+        self.get_auth()
+        return self.access_token, self.expiration_time
+
+    @accepts_deadline
     def get_access_token(self):
 
         """
@@ -86,15 +112,19 @@ class SptfySearchClient:
         If it doesn't exist, or is expired, it requests authorisation, and returns the new token
         """
 
-        token = self.access_token
-        expires = self.expiration_time
-        now = datetime.datetime.now()
+        with self.token_lock:
+            token = self.access_token
+            expires = self.expiration_time
+            now = datetime.datetime.now()
 
-        if (token == None) or (expires == None) or (expires < now):
-            self.get_auth()
-            return self.get_access_token()
-        else:
-            return token
+            if (token == None) or (expires == None) or (expires < now):
+                if self.token_cache is not None:
+                    self.access_token, self.expiration_time = self.token_cache.get_token(self.client_id, self.request_token)
+                    return self.access_token
+                self.get_auth()
+                return self.get_access_token()
+            else:
+                return token
 
     def get_request_header(self):
 
@@ -106,6 +136,18 @@ class SptfySearchClient:
         access_token = self.get_access_token()
         return {"Authorization": f"Bearer {access_token}"}
 
+    @accepts_deadline
+    def get_response(self, url):
+
+        """
+        Makes a GET request to the API, using the client's token, and returns the response
+        All the requests used to obtain data go through this method
+        :param url: the url of the request
+        """
+
+        return self.transport.get(url, headers = self.get_request_header())
+
+    @accepts_deadline
     def simple_search(self, search_query):
 
         """
@@ -119,12 +161,12 @@ class SptfySearchClient:
 
         search_endpoint = "https://api.spotify.com/v1/search"  # endpoints are where the program communicates with the API
         lookup_url = f"{search_endpoint}?{search_query}"  # ? tells us that the query begins
-        request_header = self.get_request_header()
-        r = requests.get(lookup_url, headers = request_header)
+        r = self.get_response(lookup_url)
         if r.status_code != 200:
             return {}
-        return r.json()
+        return self.index_json(r.json())
 
+    @accepts_deadline
     def search(self,search_parameters = None, operator = None, operator_query = None, content_type = "track", limit = 20):
 
         """
@@ -159,17 +201,32 @@ class SptfySearchClient:
 
         return self.simple_search(search_query)
 
-    def get_track(self, track_name):
+    @accepts_deadline
+    def get_track(self, track_name, artist = None):
 
         """
         Returns the URI of a track.
         Used when adding tracks to a playlist in spotify_playlist_client.
+        If the client has a track index, the track is looked up in it first, and only searched for if it isn't there.
+        If there are no search results, an IndexError is raised. If the search request fails (i.e 429 or 5xx),
+        an Exception is raised instead, so a failed search isn't mistaken for a track that doesn't exist.
         :param track_name: the track that we want to look for
+        :param artist: the name of the track's artist, to tell apart tracks with the same name. Optional.
         """
 
+        if self.track_index is not None:
+            uri = self.track_index.get_track_uri(track_name, artist = artist)
+            if uri is not None:
+                return uri
+
         search_param = {"track" : track_name}
+        if artist is not None:
+            search_param["artist"] = artist
         track = self.search(search_parameters = search_param, content_type = "track", limit = 1)
 
+        if "tracks" not in track:
+            raise Exception(f"Could not search for '{track_name}'")
+
         return track["tracks"]["items"][0]["uri"]  # returns the URI of the first search result
 
 
@@ -229,6 +286,7 @@ class SptfySearchClient:
 
         return f"{artist_url}{search_key}"
 
+    @accepts_deadline
     def get_resource(self, id, resource_type = "artist", keyword = "none", country = None):
 
         """
@@ -249,15 +307,271 @@ class SptfySearchClient:
         elif resource_type.lower() != "artist":
             print(f"'{resource_type}' is not a valid resource type. Passing default value: 'artist'.")
 
-        request_header = self.get_request_header()  # pass in the token
-        r = requests.get(lookup_url, headers=request_header)
+        cached = self.get_cached_json(lookup_url)
+        if cached is not None:
+            return cached
+
+        r = self.get_response(lookup_url)
 
         if r.status_code != 200:
             print(f"Status Code: {r.status_code}")
             print("There was a problem. Perhaps you need to specify the content_type, or ensure the keyword is appropiate.")
             return {}
-        return r.json()
+        return self.cache_json(lookup_url, self.index_json(r.json()))
+
+    @accepts_deadline
+    def get_json(self, url):
+
+        """
+        Makes a request to a complete API url (i.e the "next" url of a page of results)
+        Returns the JSON of the response, or an empty dictionary if the request fails
+        :param url: the url of the request
+        """
+
+        cached = self.get_cached_json(url)
+        if cached is not None:
+            return cached
+
+        r = self.get_response(url)
+
+        if r.status_code != 200:
+            print(f"Status Code: {r.status_code} ({url})")
+            return {}
+        return self.cache_json(url, self.index_json(r.json()))
+
+    def get_cached_json(self, url):
+
+        """
+        Returns the cached JSON for a url, or None if it isn't cached (or the client has no resource cache)
+        :param url: the url of the request
+        """
+
+        if self.resource_cache is None:
+            return None
+
+        return self.resource_cache.get(url)
+
+    def cache_json(self, url, result):
+
+        """
+        Adds the JSON for a url to the client's resource cache (if it has one), and returns it
+        :param url: the url of the request
+        :param result: the JSON of the response
+        """
+
+        if self.resource_cache is not None:
+            self.resource_cache.put(url, result)
+
+        return result
+
+    def index_json(self, result):
+
+        """
+        Adds the tracks, albums & artists of a result to the client's track index (if it has one), and returns the result
+        :param result: the JSON of a response
+        """
+
+        if self.track_index is not None:
+            self.track_index.add_json(result)
+
+        return result
+
+    @accepts_deadline
+    def get_pages(self, page, key = None):
+
+        """
+        Yields a page of results, and every page after it, following the "next" url of each page
+        Pages are requested as they are needed, so the results are never held in memory all at once
+        :param page: the first page of results (i.e the result of "search" or "get_new_releases")
+        :param key: the key under which the page is found, if the results are wrapped (i.e "tracks" for a track search)
+        """
+
+        while page:
+            if key is not None:
+                page = page.get(key, {})
+            yield page
+
+            if not page.get("next"):
+                break
+            page = self.get_json(page["next"])
+
+    @accepts_deadline
+    def get_artist_album_ids(self, artist_id, include_groups = "album,single", market = None, executor = None):
+
+        """
+        Returns the ids of all the albums of an artist, going through every page of results
+        Releases of the same album (i.e one per market) only appear once
+        :param artist_id: the id of the artist
+        :param include_groups: comma separated album types to include: album, single, appears_on and compilation
+        :param market: an ISO 3166-1 alpha-2 country code. If given, only albums available in the market are returned
+        :param executor: a ThreadPoolExecutor used to request the pages after the first one at once
+        """
+
+        query = {"include_groups": include_groups, "limit": 50}
+        if market is not None:
+            query["market"] = market
+
+        albums_url = self.get_artists_url(artist_id, keyword = "albums")
+        first_page = self.get_json(f"{albums_url}?{urlencode(query)}")
+        pages = [first_page]
+
+        # the total is known from the first page, so the remaining pages can be requested at once
+        offsets = range(50, first_page.get("total", 0), 50)
+        page_urls = [f"{albums_url}?{urlencode(dict(query, offset = offset))}" for offset in offsets]
+
+        if executor is None:
+            pages.extend(self.get_json(url) for url in page_urls)
+        else:
+            pages.extend(executor.map(propagate(self.get_json), page_urls))
+
+        album_ids = []
+        seen_releases = set()
+
+        for page in pages:
+            for album in page.get("items", []):
+                release = (album["name"].lower(), album["album_type"], album.get("release_date"), album.get("total_tracks"))
+                if release not in seen_releases:
+                    seen_releases.add(release)
+                    album_ids.append(album["id"])
+
+        return list(dict.fromkeys(album_ids))
+
+    @accepts_deadline
+    def get_several_albums(self, album_ids, market = None):
+
+        """
+        Returns the full albums (with their first page of tracks) for up to 20 album ids, using a single request
+        :param album_ids: a list of at most 20 album ids
+        :param market: an ISO 3166-1 alpha-2 country code
+        """
+
+        query = {"ids": ",".join(album_ids)}
+        if market is not None:
+            query["market"] = market
+
+        albums = self.get_json(f"{self.base_url}/albums?{urlencode(query)}")
+
+        return [album for album in albums.get("albums", []) if album is not None]
+
+    @accepts_deadline
+    def get_discography(self, artist_id, include_groups = "album,single", market = None, max_workers = 8):
+
+        """
+        Yields every album of an artist, including all of its tracks.
+        Albums are requested 20 at a time, and the remaining pages of tracks of every album are requested at once.
+        Albums are yielded as soon as they are complete (so not necessarily in release order),
+        and each album (and each track within an album) only appears once.
+        :param artist_id: the id of the artist
+        :param include_groups: comma separated album types to include: album, single, appears_on and compilation
+        :param market: an ISO 3166-1 alpha-2 country code
+        :param max_workers: the maximum number of requests sent at once
+        """
+
+        # the token is requested here, once, rather than by the first request of each thread:
+        # the threads would otherwise queue on token_lock while it is requested
+        self.get_access_token()
+
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            album_ids = self.get_artist_album_ids(artist_id, include_groups = include_groups, market = market,
+                                                  executor = executor)
+
+            batches = [album_ids[i:i + 20] for i in range(0, len(album_ids), 20)]
+            batch_futures = [executor.submit(propagate(self.get_several_albums), batch, market) for batch in batches]
+
+            for batch_future in as_completed(batch_futures):
+                albums = batch_future.result()
+                track_futures = {}
+
+                for album in albums:
+                    tracks_url = self.get_albums_url(album["id"], keyword = "tracks")
+                    for offset in range(len(album["tracks"]["items"]), album["tracks"]["total"], 50):
+                        query = {"offset": offset, "limit": 50}
+                        if market is not None:
+                            query["market"] = market
+                        future = executor.submit(propagate(self.get_json), f"{tracks_url}?{urlencode(query)}")
+                        track_futures.setdefault(album["id"], []).append(future)
+
+                for album in albums:
+                    tracks = album["tracks"]["items"]
+                    for future in track_futures.get(album["id"], []):
+                        tracks.extend(future.result().get("items", []))
+
+                    album["tracks"]["items"] = list({track["id"]: track for track in tracks}.values())
+                    album["tracks"]["next"] = None
+                    yield album
+
+    @accepts_deadline
+    def get_top_tracks_by_market(self, artist_ids, markets, max_workers = 16):
+
+        """
+        Returns the top tracks of several artists in several markets, requesting every artist & market at once
+        The result shows where each track charts:
+        {artist_id: {track_id: {"name": ..., "uri": ..., "popularity": ..., "markets": {market: rank}}}}
+        where rank is the position of the track (starting at 1) within the market's top tracks
+        Artists & markets whose request fails are left out (and printed by get_json)
+        If the deadline passes, DeadlineExceeded is raised, with the top tracks obtained so far as its partial results
+        :param artist_ids: a list of artist ids
+        :param markets: a list of ISO 3166-1 alpha-2 country codes
+        :param max_workers: the maximum number of requests sent at once
+        """
+
+        cells = [(artist_id, market.upper()) for artist_id in artist_ids for market in markets]
+        urls = [self.get_artists_url(artist_id, keyword = "top-tracks", country = market) for artist_id, market in cells]
+
+        self.get_access_token()  # shared by the request of every artist & market (see get_discography)
+
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            responses = executor.map(propagate(self.get_json), urls)
+
+            top_tracks = {artist_id: {} for artist_id in artist_ids}
+
+            for (artist_id, market), response in zip(cells, until_deadline(responses, top_tracks)):
+                for rank, track in enumerate(response.get("tracks", []), start = 1):
+                    track_info = top_tracks[artist_id].setdefault(track["id"], {
+                        "name": track["name"],
+                        "uri": track["uri"],
+                        "popularity": track.get("popularity"),
+                        "markets": {}
+                    })
+                    track_info["markets"][market] = rank
+
+        return top_tracks
+
+    @accepts_deadline
+    def get_recommendations(self, seed_artists = (), seed_tracks = (), seed_genres = (), limit = 20, market = None,
+                            **tunables):
+
+        """
+        Returns a list of tracks recommended from up to 5 seeds (artists, tracks and genres combined)
+        If more than 5 seeds (or none) are given, a ValueError is raised.
+        :param seed_artists: a list of artist ids
+        :param seed_tracks: a list of track ids
+        :param seed_genres: a list of genres (i.e "hip-hop")
+        :param limit: the number of tracks returned. Minimum: 1. Maximum: 100.
+        :param market: an ISO 3166-1 alpha-2 country code
+        :param tunables: target, minimum or maximum track attributes (i.e target_energy = 0.8, min_popularity = 50)
+        """
+        # https://developer.spotify.com/documentation/web-api/reference/browse/get-recommendations/
+
+        seed_count = len(seed_artists) + len(seed_tracks) + len(seed_genres)
+
+        if seed_count == 0 or seed_count > 5:
+            raise ValueError(f"Recommendations need between 1 and 5 seeds ({seed_count} were given)")
+
+        query = {"limit": limit}
+        if seed_artists:
+            query["seed_artists"] = ",".join(seed_artists)
+        if seed_tracks:
+            query["seed_tracks"] = ",".join(seed_tracks)
+        if seed_genres:
+            query["seed_genres"] = ",".join(seed_genres)
+        if market is not None:
+            query["market"] = market
+        query.update(tunables)
+
+        return self.get_json(f"{self.base_url}/recommendations?{urlencode(query)}").get("tracks", [])
 
+    @accepts_deadline
     def print_search_result(self, search_parameters = None, operator = None, operator_query = None, content_type = "track", limit = 20):
 
         """
@@ -298,6 +612,7 @@ class SptfySearchClient:
             print(f"URI: {album_uri}\n")
             print("----------------------------\n")
 
+    @accepts_deadline
     def print_artist(self, id, keyword = "none", country = None):
 
         """
@@ -323,6 +638,7 @@ class SptfySearchClient:
         print(f"URI: {artist_uri}\n")
 
 
+    @accepts_deadline
     def print_album(self, id, keyword = "none", country = None):
 
         """
@@ -364,6 +680,7 @@ class SptfySearchClient:
         print(f"Songs from {album_name}:")
         self.print_tracks(album_resource["tracks"])
 
+    @accepts_deadline
     def print_top_tracks(self, id, country):
 
         """
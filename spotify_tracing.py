@@ -0,0 +1,299 @@
+import os  # used to identify the process in exported traces
+import json  # used to export traces
+import time  # used to time spans
+import pstats  # used to gather the profiles of spans
+import cProfile  # used to profile spans
+import inspect  # used to find the methods of a client
+import threading  # used so that each thread has its own stack of spans
+import functools  # used to keep the names & docstrings of traced methods
+
+from contextlib import contextmanager  # used to create spans with a "with" statement
+from urllib.parse import urlparse  # used to name HTTP spans
+
+from spotify_resilience import get_endpoint  # used to name HTTP spans by endpoint
+from spotify_deadline import check_deadline  # used so no request is traced once the deadline has passed
+
+# Spans measure how long each step of an operation takes: client methods, token requests, HTTP requests,
+# decoding JSON and printing results. Spans started within another span are nested inside it,
+# so a slow operation can be broken down into time waiting on the network, on tokens or on Python itself.
+# Traces are exported as Chrome trace events, which can be opened with chrome://tracing or https://ui.perfetto.dev
+
+
+class Tracer:
+
+    """
+    Records nested spans, from any number of threads.
+    """
+
+    def __init__(self, profile=()):
+
+        """
+        profile: the names of the spans profiled with cProfile (i.e ["SptfyPlaylistClient.add_tracks_to_playlist"]).
+        Spans started within a profiled span aren't profiled separately.
+        events: the recorded spans, as Chrome trace events.
+        profiles: the profile of each profiled span name, gathered across calls.
+        """
+
+        self.profile = set(profile)
+
+        self.events = []
+        self.profiles = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.start = time.perf_counter()
+
+    def get_stack(self):
+
+        """
+        Returns the stack of spans in progress in the current thread.
+        Each span in the stack holds the time spent in its nested spans.
+        """
+
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+            self.local.profiling = False
+
+        return self.local.stack
+
+    @contextmanager
+    def span(self, name, category="client", **args):
+
+        """
+        Times the code run within a "with" statement
+        i.e with tracer.span("render", category="render"): ...
+        :param name: the name of the span
+        :param category: the kind of step ("client", "token", "http", "decode" or "render")
+        :param args: details shown alongside the span (i.e the URL of a request)
+        """
+
+        stack = self.get_stack()
+        frame = {"children": 0}
+        stack.append(frame)
+
+        profiler = None
+        if name in self.profile and not self.local.profiling:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                self.local.profiling = True
+            except ValueError:
+                # another profiler is running (i.e in another thread, which Python 3.12+ doesn't allow)
+                profiler = None
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+
+            if profiler is not None:
+                profiler.disable()
+                self.local.profiling = False
+
+            stack.pop()
+            if stack:
+                stack[-1]["children"] += duration
+
+            event = {"name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                     "ts": round((start - self.start) * 1e6, 3), "dur": round(duration * 1e6, 3),
+                     "args": dict(args, self_time=round((duration - frame["children"]) * 1e6, 3))}
+
+            with self.lock:
+                self.events.append(event)
+
+                if profiler is not None:
+                    if name in self.profiles:
+                        self.profiles[name].add(profiler)
+                    else:
+                        self.profiles[name] = pstats.Stats(profiler)
+
+    def trace_method(self, name, method, category="client"):
+
+        """
+        Returns a function which runs a method within a span
+        The steps of generator methods (i.e get_discography) are traced separately, as they are consumed
+        :param name: the name of the span
+        :param method: the (bound) method to trace
+        :param category: the kind of step
+        """
+
+        if inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def traced_generator(*args, **kwargs):
+                generator = method(*args, **kwargs)
+                while True:
+                    with self.span(name, category):
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                    yield item
+
+            return traced_generator
+
+        @functools.wraps(method)
+        def traced(*args, **kwargs):
+            with self.span(name, category):
+                return method(*args, **kwargs)
+
+        return traced
+
+    def instrument(self, client):
+
+        """
+        Traces every public method of a client (i.e SptfySearchClient), including calls between its own methods,
+        and wraps its transport in a TracingTransport (unless it already is one)
+        The Search Client used by a Playlist or Browse Client is instrumented too. A client that was already
+        instrumented (i.e a Search Client shared by a Playlist & a Browse Client) is left as it is, so its methods
+        & requests aren't traced twice.
+        Returns the client.
+        :param client: the client to instrument
+        """
+
+        if getattr(client, "tracer", None) is not None:
+            return client
+
+        client.tracer = self
+
+        if hasattr(client, "transport") and not isinstance(client.transport, TracingTransport):
+            client.transport = TracingTransport(client.transport, self)
+
+        class_name = type(client).__name__
+
+        for name, method in inspect.getmembers(client, inspect.ismethod):
+            if name.startswith("_"):
+                continue
+
+            if "token" in name or "auth" in name:
+                category = "token"
+            elif name.startswith("print"):
+                category = "render"
+            elif name.startswith("decode"):
+                category = "decode"
+            else:
+                category = "client"
+
+            setattr(client, name, self.trace_method(f"{class_name}.{name}", method, category))
+
+        if hasattr(client, "get_search_client"):
+            self.instrument(client.get_search_client())
+
+        return client
+
+    def get_totals(self):
+
+        """
+        Returns the time (in seconds) spent in each category of spans, not counting the time spent in nested spans
+        i.e {"client": 0.01, "token": 0.2, "http": 1.4, "decode": 0.05, "render": 0.02}
+        """
+
+        totals = {}
+
+        with self.lock:
+            for event in self.events:
+                totals[event["cat"]] = totals.get(event["cat"], 0) + event["args"]["self_time"] / 1e6
+
+        return totals
+
+    def print_profile(self, name, sort="cumulative", limit=20):
+
+        """
+        Prints the profile of a span name
+        :param name: the name of a profiled span
+        :param sort: the order of the functions (see pstats.Stats.sort_stats)
+        :param limit: the number of functions printed
+        """
+
+        if name not in self.profiles:
+            print(f"'{name}' hasn't been profiled")
+            return
+
+        self.profiles[name].sort_stats(sort).print_stats(limit)
+
+    def export(self, path):
+
+        """
+        Writes the recorded spans to a Chrome trace event (JSON) file
+        :param path: the path of the trace file (i.e "trace.json")
+        """
+
+        with self.lock:
+            events = list(self.events)
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def clear(self):
+        with self.lock:
+            self.events = []
+            self.profiles = {}
+
+
+class TracedResponse:
+
+    """
+    Wraps a response, so decoding its JSON is traced.
+    """
+
+    def __init__(self, response, tracer, endpoint):
+        self.response = response
+        self.tracer = tracer
+        self.endpoint = endpoint
+
+    def json(self):
+        with self.tracer.span(f"decode {self.endpoint}", category="decode", size=len(self.response.text)):
+            return self.response.json()
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+class TracingTransport:
+
+    """
+    Wraps a transport (see spotify_transport), tracing every request & the decoding of its response.
+    Token requests are in the "token" category, other requests in the "http" category.
+    """
+
+    def __init__(self, transport, tracer):
+
+        """
+        transport: the transport used to send the requests.
+        tracer: the Tracer recording the spans.
+        """
+
+        self.transport = transport
+        self.tracer = tracer
+
+    def request(self, method, url, **kwargs):
+
+        """
+        Makes a request within a span, and returns the response
+        If the deadline of the operation has passed, DeadlineExceeded is raised, and no span is recorded.
+        Otherwise, the wrapped transport bounds the request by the time left.
+        """
+
+        endpoint = get_endpoint(url)
+        category = "token" if urlparse(url).netloc == "accounts.spotify.com" else "http"
+        check_deadline()
+
+        with self.tracer.span(f"{method} {endpoint}", category=category, url=url):
+            r = self.transport.request(method, url, **kwargs)
+
+        return TracedResponse(r, self.tracer, endpoint)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.transport.close()
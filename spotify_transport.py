@@ -0,0 +1,151 @@
+# Transports are used by the clients to communicate with the Spotify Web API.
+# They all provide the same methods (request, get, post, put & delete), and return responses
+# with a "status_code", "headers", "text" and a "json()" method, so the clients don't depend on how requests are sent.
+# Requests always have a timeout: the transport's, or the time left until the deadline of the operation (if shorter).
+
+from spotify_deadline import get_timeout, check_deadline  # used to bound requests by the deadline of the operation
+
+
+class RequestsTransport:
+
+    """
+    HTTP/1.1 transport, using a requests Session.
+    The session keeps connections alive, so consecutive requests to the same host reuse the same socket.
+    """
+
+    def __init__(self, pool_size=10, timeout=30):
+
+        """
+        pool_size: the maximum number of connections kept open for each host.
+        timeout: the number of seconds a request waits for Spotify, if no shorter timeout (or deadline) is given.
+        session: the requests Session used to make the requests.
+        """
+
+        import requests  # used to make HTTP/1.1 requests (imported here, so HTTP/2 users don't pay for it)
+
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+
+        """
+        Makes a request, and returns the response
+        :param method: the HTTP method ("GET", "POST", "PUT" or "DELETE")
+        :param url: the URL of the request
+        :param kwargs: arguments of the request (i.e headers, data, params, timeout)
+        """
+
+        kwargs["timeout"] = get_timeout(kwargs.get("timeout", self.timeout))
+
+        try:
+            return self.session.request(method, url, **kwargs)
+        except Exception:
+            check_deadline()  # a request cut short by the deadline raises DeadlineExceeded
+            raise
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class HTTP2Transport:
+
+    """
+    HTTP/2 transport, using httpx (installed with: pip install "httpx[http2]").
+    Requests to the same host are multiplexed over a few connections,
+    so running many requests at once doesn't require a socket (and a TLS handshake) per request.
+    """
+
+    def __init__(self, max_connections=4, http1=True, verify=True, timeout=30):
+
+        """
+        max_connections: the maximum number of connections kept open. Each one can carry many requests at once.
+        http1: whether to allow falling back to HTTP/1.1. If False, HTTP/2 is used without negotiation,
+        which is required for servers that don't use TLS (i.e a local h2 server).
+        verify: whether to verify TLS certificates.
+        timeout: the number of seconds a request waits for Spotify, if no shorter timeout (or deadline) is given.
+        client: the httpx Client used to make the requests.
+        """
+
+        try:
+            import httpx  # only required when using HTTP/2
+        except ImportError:
+            raise ImportError('HTTP/2 transport requires httpx. Install it with: pip install "httpx[http2]"')
+
+        self.max_connections = max_connections
+        self.timeout = timeout
+
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.client = httpx.Client(http1=http1, http2=True, limits=limits, verify=verify)
+
+    def request(self, method, url, **kwargs):
+
+        """
+        Makes a request, and returns the response
+        Arguments are the same as for RequestsTransport, so the clients don't have to change them.
+        :param method: the HTTP method ("GET", "POST", "PUT" or "DELETE")
+        :param url: the URL of the request
+        :param kwargs: arguments of the request (i.e headers, data, params, timeout)
+        """
+
+        data = kwargs.pop("data", None)
+        kwargs["timeout"] = get_timeout(kwargs.get("timeout", self.timeout))
+
+        # httpx expects raw bodies (i.e JSON Strings) as "content", and form dictionaries as "data"
+        if isinstance(data, (str, bytes)):
+            kwargs["content"] = data
+        elif data is not None:
+            kwargs["data"] = data
+
+        try:
+            return self.client.request(method, url, **kwargs)
+        except Exception:
+            check_deadline()  # a request cut short by the deadline raises DeadlineExceeded
+            raise
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+
+def get_transport(kind="http1", **kwargs):
+
+    """
+    Returns a transport to be passed to the clients
+    :param kind: either "http1" (requests) or "http2" (httpx)
+    :param kwargs: arguments for the transport (i.e pool_size for "http1", max_connections for "http2")
+    """
+
+    if kind == "http1":
+        return RequestsTransport(**kwargs)
+    elif kind == "http2":
+        return HTTP2Transport(**kwargs)
+
+    raise ValueError(f"'{kind}' is not a valid transport. Use either 'http1' or 'http2'")
@@ -0,0 +1,372 @@
+import os  # used to replace index files atomically
+import mmap  # used to read saved indexes without loading them into memory
+import struct  # used to read & write the header of index files
+import threading  # used so that threads sharing a client can add to the index at once
+import unicodedata  # used to remove accents when normalizing text
+
+from array import array  # used to store offsets & posting lists compactly
+
+# A local full-text index over the tracks, albums and artists already fetched from the Spotify Web API,
+# so tracks can be resolved (i.e by SptfySearchClient.get_track) without a request.
+#
+# Each entity is indexed by 3 kinds of terms:
+# - "t:<token>": each normalized word of its name (and, for tracks & albums, of its artists' names).
+# - "k:<artist>|<title>": its normalized (first) artist & name, for exact lookups.
+# - "i:<id>": its id, so an entity is only indexed once.
+#
+# Saved indexes are a single binary file, read through memory mapping, so only the parts used by a lookup are read:
+#   header | records | record offsets | terms | term offsets | postings | posting offsets
+# Terms are sorted, so they are found with a binary search. Postings are the numbers of the records containing a term.
+
+magic = b"SPTIDX01"
+header_format = "<8s8Q"  # magic, number of records, number of terms, then the offset of each section
+kinds = ("track", "album", "artist")
+separator = "\x1f"  # separates the artists of a record
+
+
+def normalize(text):
+
+    """
+    Returns a text in lowercase, without accents or punctuation, and with single spaces
+    i.e "Beyoncé - Halo (Remastered)" => "beyonce halo remastered"
+    :param text: the text to normalize
+    """
+
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c if c.isalnum() else " " for c in text if not unicodedata.combining(c))
+
+    return " ".join(text.lower().split())
+
+
+def get_key(artist, title):
+    return f"k:{normalize(artist)}|{normalize(title)}"
+
+
+class IndexRecord:
+
+    """
+    A track, album or artist in the index.
+    """
+
+    def __init__(self, kind, id, name, artists, popularity):
+        self.kind = kind
+        self.id = id
+        self.name = name
+        self.artists = artists
+        self.popularity = popularity
+
+    @property
+    def uri(self):
+        return f"spotify:{self.kind}:{self.id}"
+
+    def get_terms(self):
+
+        """
+        Returns the terms under which the record is indexed
+        """
+
+        tokens = set(normalize(self.name).split())
+        for artist in self.artists:
+            tokens.update(normalize(artist).split())
+
+        terms = {f"t:{token}" for token in tokens}
+        terms.add(f"i:{self.id}")
+        terms.add(get_key(self.artists[0] if self.artists else "", self.name))
+
+        return terms
+
+    def to_bytes(self):
+        # tabs & new lines separate fields, so they are replaced by spaces
+        fields = [self.kind, self.id, " ".join(self.name.split()),
+                  separator.join(" ".join(artist.split()) for artist in self.artists), str(self.popularity)]
+        return "\t".join(fields).encode()
+
+    @classmethod
+    def from_bytes(cls, data):
+        kind, id, name, artists, popularity = data.decode().split("\t")
+        return cls(kind, id, name, artists.split(separator) if artists else [], int(popularity))
+
+
+class TrackIndex:
+
+    """
+    Full-text index over fetched tracks, albums & artists.
+    Entities added since the index was loaded are held in memory, until the index is saved.
+    """
+
+    def __init__(self, path=None):
+
+        """
+        path: the path of a saved index. If it exists, it is loaded (memory mapped). Optional.
+        records: the records added since the index was loaded.
+        postings: the numbers of the records containing each term, for the records added since the index was loaded.
+        """
+
+        self.path = path
+
+        self.records = []
+        self.postings = {}
+        self.lock = threading.Lock()
+
+        self.file = None
+        self.map = None
+        self.saved_records = 0
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return self.saved_records + len(self.records)
+
+    def load(self, path):
+
+        """
+        Memory maps a saved index
+        :param path: the path of the saved index
+        """
+
+        self.close()
+
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = struct.unpack_from(header_format, self.map)
+        if header[0] != magic:
+            raise ValueError(f"{path} is not a track index")
+
+        self.saved_records, self.saved_terms = header[1], header[2]
+        records, record_offsets, terms, term_offsets, postings, posting_offsets = header[3:]
+
+        self.view = memoryview(self.map)
+        self.record_data = self.view[records:record_offsets]
+        self.record_offsets = self.view[record_offsets:terms].cast("Q")
+        self.term_data = self.view[terms:term_offsets]
+        self.term_offsets = self.view[term_offsets:postings].cast("Q")
+        self.posting_data = self.view[postings:posting_offsets].cast("I")
+        self.posting_offsets = self.view[posting_offsets:].cast("Q")
+
+    def get_saved_term(self, i):
+        return bytes(self.term_data[self.term_offsets[i]:self.term_offsets[i + 1]])
+
+    def get_saved_postings(self, term):
+
+        """
+        Returns the numbers of the saved records containing a term, found with a binary search over the sorted terms
+        :param term: the term (i.e "t:eminem")
+        """
+
+        if self.map is None:
+            return []
+
+        term = term.encode()
+        lo, hi = 0, self.saved_terms
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.get_saved_term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo == self.saved_terms or self.get_saved_term(lo) != term:
+            return []
+
+        return self.posting_data[self.posting_offsets[lo]:self.posting_offsets[lo + 1]].tolist()
+
+    def get_record(self, number):
+
+        """
+        Returns a record, by its number (saved records come first)
+        :param number: the number of the record
+        """
+
+        if number < self.saved_records:
+            return IndexRecord.from_bytes(bytes(self.record_data[self.record_offsets[number]:
+                                                                 self.record_offsets[number + 1]]))
+
+        return self.records[number - self.saved_records]
+
+    def get_postings(self, term):
+        return self.get_saved_postings(term) + self.postings.get(term, [])
+
+    def add(self, kind, id, name, artists=(), popularity=0):
+
+        """
+        Adds a track, album or artist to the index, unless it is already indexed
+        :param kind: either "track", "album" or "artist"
+        :param id: the Spotify id
+        :param name: the name
+        :param artists: the names of its artists (tracks & albums)
+        :param popularity: its Spotify popularity (0 - 100), used to rank results
+        """
+
+        record = IndexRecord(kind, id, name, list(artists), popularity or 0)
+
+        with self.lock:
+            if self.get_postings(f"i:{id}"):
+                return
+
+            number = len(self)
+            self.records.append(record)
+
+            for term in record.get_terms():
+                self.postings.setdefault(term, []).append(number)
+
+    def add_json(self, data):
+
+        """
+        Adds every track, album and artist found in a response of the Spotify Web API
+        (i.e search results, an album and its tracks, an artist's top tracks)
+        :param data: the JSON of the response
+        """
+
+        if isinstance(data, list):
+            for item in data:
+                self.add_json(item)
+            return
+
+        if not isinstance(data, dict):
+            return
+
+        if data.get("type") in kinds and data.get("id") and data.get("name"):
+            self.add(data["type"], data["id"], data["name"],
+                     artists=[artist["name"] for artist in data.get("artists", [])],
+                     popularity=data.get("popularity", 0))
+
+        for value in data.values():
+            if isinstance(value, (dict, list)):
+                self.add_json(value)
+
+    def search(self, text, kind="track", limit=20):
+
+        """
+        Returns the indexed records of a kind whose name (or artists' names) contain every word of a text,
+        the most popular first
+        :param text: the words to look for (i.e "lose yourself eminem")
+        :param kind: either "track", "album" or "artist"
+        :param limit: the maximum number of records returned
+        """
+
+        tokens = normalize(text).split()
+
+        if not tokens:
+            return []
+
+        with self.lock:
+            numbers = None
+            for token in sorted(tokens, key=len, reverse=True):
+                postings = set(self.get_postings(f"t:{token}"))
+                numbers = postings if numbers is None else numbers & postings
+                if not numbers:
+                    return []
+
+            records = [self.get_record(number) for number in numbers]
+
+        records = [record for record in records if record.kind == kind]
+
+        return sorted(records, key=lambda record: record.popularity, reverse=True)[:limit]
+
+    def get_track_uri(self, title, artist=None):
+
+        """
+        Returns the URI of the most popular indexed track with a title, or None if there isn't one
+        :param title: the title of the track (i.e "Lose Yourself")
+        :param artist: the name of the track's (first) artist. If None, tracks by any artist match.
+        """
+
+        if artist is not None:
+            with self.lock:
+                records = [self.get_record(number) for number in self.get_postings(get_key(artist, title))]
+            records = [record for record in records if record.kind == "track"]
+        else:
+            title = normalize(title)
+            records = [record for record in self.search(title, kind="track", limit=len(self))
+                       if normalize(record.name) == title]
+
+        if not records:
+            return None
+
+        return max(records, key=lambda record: record.popularity).uri
+
+    def save(self, path=None):
+
+        """
+        Writes every record (saved & added) to a single file, which is then memory mapped
+        :param path: the path of the file. If None, the path the index was created with is used.
+        """
+
+        path = path if path is not None else self.path
+
+        if path is None:
+            raise ValueError("You need to provide a path to save the index to")
+
+        with self.lock:
+            record_offsets = array("Q", [0])
+            record_data = bytearray()
+            postings = {}
+
+            for number in range(len(self)):
+                record = self.get_record(number)
+                record_data += record.to_bytes()
+                record_offsets.append(len(record_data))
+
+                for term in record.get_terms():
+                    postings.setdefault(term.encode(), array("I")).append(number)
+
+            terms = sorted(postings)
+            term_offsets = array("Q", [0])
+            term_data = bytearray()
+            posting_offsets = array("Q", [0])
+            posting_data = array("I")
+
+            for term in terms:
+                term_data += term
+                term_offsets.append(len(term_data))
+                posting_data.extend(postings[term])
+                posting_offsets.append(len(posting_data))
+
+            sections = [bytes(record_data), record_offsets.tobytes(), bytes(term_data), term_offsets.tobytes(),
+                        posting_data.tobytes(), posting_offsets.tobytes()]
+
+            offsets = []
+            position = struct.calcsize(header_format)
+            for i, section in enumerate(sections):
+                # align every section, so offsets & postings can be read as arrays
+                padding = -position % 8
+                sections[i] = b"\0" * padding + section
+                offsets.append(position + padding)
+                position += padding + len(section)
+
+            temporary_path = f"{path}.tmp"
+            with open(temporary_path, "wb") as f:
+                f.write(struct.pack(header_format, magic, len(record_offsets) - 1, len(terms), *offsets))
+                for section in sections:
+                    f.write(section)
+
+            self.records = []
+            self.postings = {}
+            self.close()
+            os.replace(temporary_path, path)
+            self.path = path
+            self.load(path)
+
+        print(f"Saved {self.saved_records} records ({self.saved_terms} terms) to {path}")
+
+    def close(self):
+
+        """
+        Releases the memory mapped file of a saved index
+        """
+
+        if self.map is None:
+            return
+
+        for name in ("record_data", "record_offsets", "term_data", "term_offsets", "posting_data", "posting_offsets",
+                     "view"):
+            getattr(self, name).release()
+
+        self.map.close()
+        self.file.close()
+        self.map = None
+        self.file = None
+        self.saved_records = 0